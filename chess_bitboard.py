@@ -0,0 +1,434 @@
+# chess_bitboard.py
+# Bitboard board backend for chess_engine (one 64-bit int per color and piece type)
+#
+# Square index is y * 8 + x, so a1 = 0, h1 = 7, a8 = 56, h8 = 63.
+# BitBoard keeps Board.squares in sync as well, so Game, History and the GUI
+# work unchanged; move generation, attack tests and the check and pin scan
+# for legal moves read the bitboards.
+# Slider attacks are cached per square and relevant occupancy, so after
+# warm-up a rook or bishop lookup is one mask and one dict probe.
+
+import random
+import time
+
+from chess_engine import (Board, Game, Move, COLOR_INDEX,
+                          PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+
+PROMOTIONS = ["Queen", "Rook", "Bishop", "Knight"]
+
+SQ_XY = [(sq % 8, sq // 8) for sq in range(64)]
+RANK_1 = 0xFF
+RANK_3 = 0xFF << 16
+RANK_6 = 0xFF << 40
+RANK_8 = 0xFF << 56
+
+
+def _leaper_masks(deltas):
+    masks = []
+    for sq in range(64):
+        x, y = sq % 8, sq // 8
+        m = 0
+        for dx, dy in deltas:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < 8 and 0 <= ny < 8:
+                m |= 1 << (ny * 8 + nx)
+        masks.append(m)
+    return masks
+
+
+KNIGHT_ATTACKS = _leaper_masks([(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)])
+KING_ATTACKS = _leaper_masks([(1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1)])
+# Squares a pawn of each color attacks from a given square
+PAWN_ATTACKS = [_leaper_masks([(1,1),(-1,1)]), _leaper_masks([(1,-1),(-1,-1)])]
+
+# Rays in each direction, excluding the origin square. "Positive" directions
+# move to higher square indices, so the nearest blocker is the lowest set bit;
+# for "negative" directions it is the highest set bit.
+ROOK_POS = [(1,0), (0,1)]
+ROOK_NEG = [(-1,0), (0,-1)]
+BISHOP_POS = [(1,1), (-1,1)]
+BISHOP_NEG = [(1,-1), (-1,-1)]
+
+
+def _ray_masks(dx, dy):
+    masks = []
+    for sq in range(64):
+        x, y = sq % 8, sq // 8
+        m = 0
+        nx, ny = x + dx, y + dy
+        while 0 <= nx < 8 and 0 <= ny < 8:
+            m |= 1 << (ny * 8 + nx)
+            nx += dx
+            ny += dy
+        masks.append(m)
+    return masks
+
+
+RAYS = {d: _ray_masks(*d) for d in ROOK_POS + ROOK_NEG + BISHOP_POS + BISHOP_NEG}
+ROOK_RAYS = ([RAYS[d] for d in ROOK_POS], [RAYS[d] for d in ROOK_NEG])
+BISHOP_RAYS = ([RAYS[d] for d in BISHOP_POS], [RAYS[d] for d in BISHOP_NEG])
+QUEEN_RAYS = (ROOK_RAYS[0] + BISHOP_RAYS[0], ROOK_RAYS[1] + BISHOP_RAYS[1])
+
+
+def slider_attacks(sq, occ, rays):
+    pos_rays, neg_rays = rays
+    attacks = 0
+    for ray in pos_rays:
+        r = ray[sq]
+        blockers = r & occ
+        if blockers:
+            b = (blockers & -blockers).bit_length() - 1
+            r ^= ray[b]
+        attacks |= r
+    for ray in neg_rays:
+        r = ray[sq]
+        blockers = r & occ
+        if blockers:
+            b = blockers.bit_length() - 1
+            r ^= ray[b]
+        attacks |= r
+    return attacks
+
+
+def _between_masks():
+    # BETWEEN[a][b]: squares strictly between two squares on a common line,
+    # for every b on one of a's rays; SEGMENT_XY[a][b]: those squares plus b
+    between = [{} for _ in range(64)]
+    segment = [{} for _ in range(64)]
+    for ray in RAYS.values():
+        for a in range(64):
+            r = ray[a]
+            while r:
+                bit = r & -r
+                r ^= bit
+                b = bit.bit_length() - 1
+                m = ray[a] & ~ray[b] & ~bit
+                between[a][b] = m
+                line = m | bit
+                xy = []
+                while line:
+                    t = line & -line
+                    line ^= t
+                    xy.append(SQ_XY[t.bit_length() - 1])
+                segment[a][b] = frozenset(xy)
+    return between, segment
+
+
+BETWEEN, SEGMENT_XY = _between_masks()
+
+
+def _relevant_mask(sq, dirs):
+    # Squares on sq's rays whose occupancy can change the attacks: every
+    # ray square but the last, which is attacked whether or not it is empty
+    m = 0
+    for d in dirs:
+        r = RAYS[d][sq]
+        while r:
+            b = r & -r
+            r ^= b
+            if RAYS[d][b.bit_length() - 1]:
+                m |= b
+    return m
+
+
+ROOK_MASKS = [_relevant_mask(sq, ROOK_POS + ROOK_NEG) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(sq, BISHOP_POS + BISHOP_NEG) for sq in range(64)]
+# Per square, relevant occupancy -> attack set, filled in as positions
+# come up (at most 4096 rook and 512 bishop entries per square)
+_ROOK_CACHE = [{} for _ in range(64)]
+_BISHOP_CACHE = [{} for _ in range(64)]
+
+
+def rook_attacks(sq, occ):
+    key = occ & ROOK_MASKS[sq]
+    cache = _ROOK_CACHE[sq]
+    attacks = cache.get(key)
+    if attacks is None:
+        attacks = cache[key] = slider_attacks(sq, key, ROOK_RAYS)
+    return attacks
+
+
+def bishop_attacks(sq, occ):
+    key = occ & BISHOP_MASKS[sq]
+    cache = _BISHOP_CACHE[sq]
+    attacks = cache.get(key)
+    if attacks is None:
+        attacks = cache[key] = slider_attacks(sq, key, BISHOP_RAYS)
+    return attacks
+
+
+def _piece_attacks(kind, sq, occ):
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if kind == BISHOP:
+        return bishop_attacks(sq, occ)
+    if kind == ROOK:
+        return rook_attacks(sq, occ)
+    if kind == QUEEN:
+        return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+    return KING_ATTACKS[sq]
+
+
+class BitBoard(Board):
+    def __init__(self):
+        super().__init__()
+        # bb[color][kind] -> bitboard, occ[color] -> all pieces of that color
+        self.bb = [[0] * 6, [0] * 6]
+        self.occ = [0, 0]
+
+    def put_piece(self, x, y, piece):
+        super().put_piece(x, y, piece)
+        b = 1 << (y * 8 + x)
+        c = piece.side
+        self.bb[c][piece.kind] |= b
+        self.occ[c] |= b
+
+    def remove_piece(self, x, y):
+        p = super().remove_piece(x, y)
+        if p:
+            b = ~(1 << (y * 8 + x))
+            c = p.side
+            self.bb[c][p.kind] &= b
+            self.occ[c] &= b
+        return p
+
+    def is_attacked(self, x, y, by_color):
+        c = COLOR_INDEX[by_color]
+        bb = self.bb[c]
+        sq = y * 8 + x
+        # A pawn of by_color attacks sq from where an opposite pawn on sq would attack
+        if PAWN_ATTACKS[1 - c][sq] & bb[PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & bb[KNIGHT] or KING_ATTACKS[sq] & bb[KING]:
+            return True
+        occ = self.occ[0] | self.occ[1]
+        queens = bb[QUEEN]
+        if (bb[ROOK] | queens) and rook_attacks(sq, occ) & (bb[ROOK] | queens):
+            return True
+        if (bb[BISHOP] | queens) and bishop_attacks(sq, occ) & (bb[BISHOP] | queens):
+            return True
+        return False
+
+    def checks_and_pins(self, kx, ky, color):
+        c = COLOR_INDEX[color]
+        ksq = ky * 8 + kx
+        bb = self.bb[1 - c]
+        own = self.occ[c]
+        checkers = []
+        block = set()
+        pins = {}
+
+        hits = PAWN_ATTACKS[c][ksq] & bb[PAWN] | KNIGHT_ATTACKS[ksq] & bb[KNIGHT]
+        while hits:
+            t = hits & -hits
+            hits ^= t
+            xy = SQ_XY[t.bit_length() - 1]
+            checkers.append(xy)
+            block.add(xy)
+
+        # The first enemy piece on each line from the king, looking through
+        # our own pieces: a slider there checks, or pins a lone piece between
+        enemy_occ = self.occ[1 - c]
+        queens = bb[QUEEN]
+        sliders = 0
+        if bb[ROOK] | queens:
+            sliders |= rook_attacks(ksq, enemy_occ) & (bb[ROOK] | queens)
+        if bb[BISHOP] | queens:
+            sliders |= bishop_attacks(ksq, enemy_occ) & (bb[BISHOP] | queens)
+        while sliders:
+            t = sliders & -sliders
+            sliders ^= t
+            sq = t.bit_length() - 1
+            shields = BETWEEN[ksq][sq] & own
+            if not shields:
+                checkers.append(SQ_XY[sq])
+                block.update(SEGMENT_XY[ksq][sq])
+            elif not shields & (shields - 1):
+                pins[SQ_XY[shields.bit_length() - 1]] = SEGMENT_XY[ksq][sq]
+
+        return checkers, block, pins
+
+    def generate_moves(self, color, state):
+        moves = []
+        append = moves.append
+        squares = self.squares
+        c = COLOR_INDEX[color]
+        bb = self.bb[c]
+        own = self.occ[c]
+        enemy = self.occ[1 - c]
+        occ = own | enemy
+
+        # Pawns
+        pawns = bb[PAWN]
+        if c == 0:
+            single = (pawns << 8) & ~occ
+            double = ((single & RANK_3) << 8) & ~occ
+            d = 8
+            last_rank = RANK_8
+        else:
+            single = (pawns >> 8) & ~occ
+            double = ((single & RANK_6) >> 8) & ~occ
+            d = -8
+            last_rank = RANK_1
+        for targets, back in ((single & ~last_rank, d), (double, 2 * d)):
+            while targets:
+                t = targets & -targets
+                targets ^= t
+                tsq = t.bit_length() - 1
+                tx, ty = SQ_XY[tsq]
+                fx, fy = SQ_XY[tsq - back]
+                append(Move(fx, fy, tx, ty, None, None))
+        promos = single & last_rank
+        while promos:
+            t = promos & -promos
+            promos ^= t
+            tsq = t.bit_length() - 1
+            tx, ty = SQ_XY[tsq]
+            for prom in PROMOTIONS:
+                append(Move(tx, ty - d // 8, tx, ty, None, prom))
+
+        ep = state.en_passant_target
+        ep_bit = 1 << (ep.y * 8 + ep.x) if ep else 0
+        pawn_attacks = PAWN_ATTACKS[c]
+        while pawns:
+            b = pawns & -pawns
+            pawns ^= b
+            sq = b.bit_length() - 1
+            attacks = pawn_attacks[sq]
+            targets = attacks & enemy
+            if not targets and not attacks & ep_bit:
+                continue
+            x, y = SQ_XY[sq]
+            while targets:
+                t = targets & -targets
+                targets ^= t
+                tx, ty = SQ_XY[t.bit_length() - 1]
+                captured = squares[tx][ty].piece
+                if t & last_rank:
+                    for prom in PROMOTIONS:
+                        append(Move(x, y, tx, ty, captured, prom))
+                else:
+                    append(Move(x, y, tx, ty, captured, None))
+            if attacks & ep_bit:
+                append(Move(x, y, ep.x, ep.y, squares[ep.x][y].piece, None))
+
+        # Pieces; only captures need the target square looked up
+        for kind in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            pieces = bb[kind]
+            while pieces:
+                b = pieces & -pieces
+                pieces ^= b
+                sq = b.bit_length() - 1
+                targets = _piece_attacks(kind, sq, occ)
+                x, y = SQ_XY[sq]
+                captures = targets & enemy
+                quiet = targets & ~occ
+                while captures:
+                    t = captures & -captures
+                    captures ^= t
+                    tx, ty = SQ_XY[t.bit_length() - 1]
+                    append(Move(x, y, tx, ty, squares[tx][ty].piece, None))
+                while quiet:
+                    t = quiet & -quiet
+                    quiet ^= t
+                    tx, ty = SQ_XY[t.bit_length() - 1]
+                    append(Move(x, y, tx, ty, None, None))
+
+        self._castling_moves(c, color, state, occ, append)
+        return moves
+
+    def _castling_moves(self, c, color, state, occ, append):
+        y = 0 if c == 0 else 7
+        king_sq = y * 8 + 4
+        rooks = self.bb[c][ROOK]
+        if (self.bb[c][KING] >> king_sq) & 1:
+            rights = state.castling_rights[color]
+            if rights["K"] and not (occ >> (king_sq + 1)) & 3 and (rooks >> (king_sq + 3)) & 1:
+                append(Move(4, y, 6, y, None, None))
+            if rights["Q"] and not (occ >> (king_sq - 3)) & 7 and (rooks >> (king_sq - 4)) & 1:
+                append(Move(4, y, 2, y, None, None))
+
+    # Pseudo-legal moves of the piece on (x, y), from the bitboards
+    def piece_moves(self, x, y, state):
+        squares = self.squares
+        p = squares[x][y].piece
+        c = p.side
+        kind = p.kind
+        sq = y * 8 + x
+        own = self.occ[c]
+        enemy = self.occ[1 - c]
+        occ = own | enemy
+        moves = []
+        append = moves.append
+
+        if kind == PAWN:
+            d = 8 if c == 0 else -8
+            last_rank = RANK_8 if c == 0 else RANK_1
+            ep = state.en_passant_target
+            ep_bit = 1 << (ep.y * 8 + ep.x) if ep else 0
+            targets = PAWN_ATTACKS[c][sq] & (enemy | ep_bit)
+            one = 1 << (sq + d)
+            if not one & occ:
+                targets |= one
+                if (y == 1 if c == 0 else y == 6) and not (1 << (sq + 2 * d)) & occ:
+                    targets |= 1 << (sq + 2 * d)
+            while targets:
+                t = targets & -targets
+                targets ^= t
+                tx, ty = SQ_XY[t.bit_length() - 1]
+                if t & ep_bit:
+                    captured = squares[tx][y].piece
+                else:
+                    captured = squares[tx][ty].piece if t & enemy else None
+                if t & last_rank:
+                    for prom in PROMOTIONS:
+                        append(Move(x, y, tx, ty, captured, prom))
+                else:
+                    append(Move(x, y, tx, ty, captured, None))
+            return moves
+
+        targets = _piece_attacks(kind, sq, occ) & ~own
+        while targets:
+            t = targets & -targets
+            targets ^= t
+            tx, ty = SQ_XY[t.bit_length() - 1]
+            append(Move(x, y, tx, ty, squares[tx][ty].piece if t & enemy else None, None))
+        if kind == KING:
+            self._castling_moves(c, p.color, state, occ, append)
+        return moves
+
+
+# --- Backend benchmark ---
+
+def _move_key(m):
+    return (m.from_x, m.from_y, m.to_x, m.to_y, m.promotion or "")
+
+
+def benchmark(board_class, plies=60, repeat=50, seed=1):
+    """Time generate_moves along a seeded random game; returns (calls, seconds)."""
+    game = Game(board_class)
+    game.start_game()
+    rng = random.Random(seed)
+    calls = 0
+    elapsed = 0.0
+    for _ in range(plies):
+        if game.game_over:
+            break
+        color = game.state.turn
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            game.gen.generate_moves(game.board, color, game.state)
+        elapsed += time.perf_counter() - t0
+        calls += repeat
+        legal = sorted(game.get_legal_moves_for_current_player(), key=_move_key)
+        if not legal:
+            break
+        game.make_move(rng.choice(legal))
+    return calls, elapsed
+
+
+if __name__ == "__main__":
+    for name, cls in (("mailbox", Board), ("bitboard", BitBoard)):
+        calls, secs = benchmark(cls)
+        print(f"{name:9s} {calls} generate_moves calls in {secs:.3f}s "
+              f"({calls / secs:,.0f} calls/s)")
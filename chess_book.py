@@ -0,0 +1,198 @@
+# chess_book.py
+# Polyglot-style opening book: sorted (position hash, move, weight) entries
+# in a binary file, memory-mapped and binary-searched
+#
+# Entries are 16 bytes, big-endian as in Polyglot: u64 key, u16 move,
+# u16 weight, u32 learn (unused, 0). The key is chess_engine's Zobrist
+# position hash and the move is Move.pack(), so files are not interchangeable
+# with real Polyglot books, whose keys come from a different random table.
+#
+# Usage:
+#   python chess_book.py build book.bin games.pgn [more.pgn ...] --plies 20
+#   python chess_book.py probe book.bin --fen "<fen>"
+#
+#   Searcher(book=OpeningBook("book.bin")) plays book moves without searching.
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+import time
+
+from chess_engine import Game, Move, START_FEN
+from chess_pgn import read_games, replay
+
+ENTRY = struct.Struct(">QHHI")
+_KEY = struct.Struct(">Q")
+
+# Weight credited to the side that played a move, by result from its view
+WIN_WEIGHT = 2
+DRAW_WEIGHT = 1
+
+
+class OpeningBook:
+    """Read-only opening book; probes binary-search the mapped file."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self.count = 0
+        self._map = None
+        size = self._file.seek(0, 2)
+        if size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.count = size // ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def entries(self, key):
+        """(packed move, weight) pairs stored for a position hash."""
+        m = self._map
+        size = ENTRY.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _KEY.unpack_from(m, mid * size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < self.count:
+            k, move, weight, _ = ENTRY.unpack_from(m, lo * size)
+            if k != key:
+                break
+            found.append((move, weight))
+            lo += 1
+        return found
+
+    def moves(self, game):
+        """Book moves for game's current position as (Move, weight) pairs;
+        entries that are not legal there (hash collisions) are dropped."""
+        key = game.board.zobrist ^ game.state.zobrist
+        found = []
+        for code, weight in self.entries(key):
+            move = Move.unpack(code)
+            if weight and game.is_legal_move(move):
+                found.append((move, weight))
+        return found
+
+    def pick(self, game, rng=random):
+        """A book move chosen with probability proportional to its weight,
+        or None when the position is not in the book."""
+        found = self.moves(game)
+        if not found:
+            return None
+        moves, weights = zip(*found)
+        move = rng.choices(moves, weights)[0]
+        # Return the game's own Move object, with its captured piece
+        legal = game.get_legal_moves_from(move.from_x, move.from_y)
+        return legal[legal.index(move)]
+
+
+def build(path, pgn_paths, max_plies=20, min_games=1):
+    """Writes a book of the first max_plies moves of every game in the PGN
+    files, keeping moves played in at least min_games games. Returns a
+    summary dict."""
+    t0 = time.perf_counter()
+    # (key, packed move) -> [games, weight]
+    stats = {}
+    games = bad = 0
+    for pgn_path in pgn_paths:
+        for pgn in read_games(pgn_path):
+            start = Game()
+            try:
+                start.load_fen(pgn.headers.get("FEN") or START_FEN)
+            except ValueError:
+                bad += 1
+                continue
+            key = start.board.zobrist ^ start.state.zobrist
+            white_to_move = start.state.turn == "White"
+            if pgn.result == "1/2-1/2":
+                credit = (DRAW_WEIGHT, DRAW_WEIGHT)
+            elif pgn.result == "1-0":
+                credit = (WIN_WEIGHT, 0)
+            elif pgn.result == "0-1":
+                credit = (0, WIN_WEIGHT)
+            else:
+                credit = (0, 0)
+            played = []
+            try:
+                for ply, (move, game) in enumerate(replay(pgn)):
+                    if ply >= max_plies:
+                        break
+                    played.append((key, move.pack(), credit[0 if white_to_move else 1]))
+                    key = game.board.zobrist ^ game.state.zobrist
+                    white_to_move = not white_to_move
+            except ValueError:
+                bad += 1
+                continue
+            games += 1
+            for key, code, weight in played:
+                entry = stats.get((key, code))
+                if entry is None:
+                    entry = stats[(key, code)] = [0, 0]
+                entry[0] += 1
+                entry[1] += weight
+
+    # Keep weights within 16 bits, scaling all of them by the same factor
+    top = max((w for n, w in stats.values()), default=0)
+    scale = 65535 / top if top > 65535 else 1
+    rows = []
+    for (key, code), (n, weight) in stats.items():
+        weight = int(weight * scale)
+        if n >= min_games and weight:
+            rows.append((key, -weight, code))
+    rows.sort()
+    with open(path, "wb") as f:
+        for key, weight, code in rows:
+            f.write(ENTRY.pack(key, code, -weight, 0))
+    return {"games": games, "bad_games": bad, "entries": len(rows),
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Opening book tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="build a book from PGN files")
+    b.add_argument("book")
+    b.add_argument("pgn", nargs="+")
+    b.add_argument("--plies", type=int, default=20, help="book depth in plies")
+    b.add_argument("--min-games", type=int, default=1,
+                   help="drop moves played in fewer games")
+    p = sub.add_parser("probe", help="list the book moves for a position")
+    p.add_argument("book")
+    p.add_argument("--fen", default=START_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(build(args.book, args.pgn, args.plies, args.min_games))
+        return 0
+
+    game = Game()
+    game.load_fen(args.fen)
+    with OpeningBook(args.book) as book:
+        t0 = time.perf_counter()
+        found = book.moves(game)
+        secs = time.perf_counter() - t0
+        total = sum(w for _, w in found)
+        for move, weight in sorted(found, key=lambda mw: -mw[1]):
+            print(f"{move.uci():6s} {weight:6d} {100 * weight / total:5.1f}%")
+        print(f"{len(found)} moves in {secs * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,270 @@
 # chess_engine.py
 # Core chess engine: board, moves, rules (no graphics)
 
+import os
+import random
+
+# Small-integer codes used in the hot paths; Piece keeps the string names too
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+COLOR_NAMES = ["White", "Black"]
+PIECE_NAMES = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
+COLOR_INDEX = {"White": WHITE, "Black": BLACK}
+KIND_INDEX = {name: kind for kind, name in enumerate(PIECE_NAMES)}
+
+# Per-square attack tables, indexed [x][y]
+KNIGHT_DELTAS = [(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)]
+KING_DELTAS = [(1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1)]
+ROOK_DIRS = [(1,0),(-1,0),(0,1),(0,-1)]
+BISHOP_DIRS = [(1,1),(1,-1),(-1,1),(-1,-1)]
+
+
+def _leaper_table(deltas):
+    return [[[(x + dx, y + dy) for dx, dy in deltas
+              if 0 <= x + dx < 8 and 0 <= y + dy < 8]
+             for y in range(8)] for x in range(8)]
+
+
+def _ray_table(dirs):
+    table = [[[] for y in range(8)] for x in range(8)]
+    for x in range(8):
+        for y in range(8):
+            for dx, dy in dirs:
+                ray = []
+                nx, ny = x + dx, y + dy
+                while 0 <= nx < 8 and 0 <= ny < 8:
+                    ray.append((nx, ny))
+                    nx += dx
+                    ny += dy
+                if ray:
+                    table[x][y].append(ray)
+    return table
+
+
+KNIGHT_TABLE = _leaper_table(KNIGHT_DELTAS)
+KING_TABLE = _leaper_table(KING_DELTAS)
+ROOK_RAY_TABLE = _ray_table(ROOK_DIRS)
+BISHOP_RAY_TABLE = _ray_table(BISHOP_DIRS)
+
+# Zobrist keys. Fixed seed so hashes are the same in every process and run.
+_zrng = random.Random(0x5EED)
+# Indexed by Piece.index, then [x][y]
+ZOBRIST_PIECES = [[[_zrng.getrandbits(64) for y in range(8)] for x in range(8)]
+                  for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _zrng.getrandbits(64)
+ZOBRIST_CASTLING = [_zrng.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zrng.getrandbits(64) for _ in range(8)]
+
+# Centipawns, indexed by piece kind
+PIECE_VALUES = [100, 320, 330, 500, 900, 0]
+
+# Piece-square tables from White's point of view, written rank 8 first so
+# they read like a board diagram
+_PST_DIAGRAMS = {
+    PAWN: [
+         0,  0,  0,  0,  0,  0,  0,  0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+         5,  5, 10, 25, 25, 10,  5,  5,
+         0,  0,  0, 20, 20,  0,  0,  0,
+         5, -5,-10,  0,  0,-10, -5,  5,
+         5, 10, 10,-20,-20, 10, 10,  5,
+         0,  0,  0,  0,  0,  0,  0,  0,
+    ],
+    KNIGHT: [
+        -50,-40,-30,-30,-30,-30,-40,-50,
+        -40,-20,  0,  0,  0,  0,-20,-40,
+        -30,  0, 10, 15, 15, 10,  0,-30,
+        -30,  5, 15, 20, 20, 15,  5,-30,
+        -30,  0, 15, 20, 20, 15,  0,-30,
+        -30,  5, 10, 15, 15, 10,  5,-30,
+        -40,-20,  0,  5,  5,  0,-20,-40,
+        -50,-40,-30,-30,-30,-30,-40,-50,
+    ],
+    BISHOP: [
+        -20,-10,-10,-10,-10,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0,  5, 10, 10,  5,  0,-10,
+        -10,  5,  5, 10, 10,  5,  5,-10,
+        -10,  0, 10, 10, 10, 10,  0,-10,
+        -10, 10, 10, 10, 10, 10, 10,-10,
+        -10,  5,  0,  0,  0,  0,  5,-10,
+        -20,-10,-10,-10,-10,-10,-10,-20,
+    ],
+    ROOK: [
+          0,  0,  0,  0,  0,  0,  0,  0,
+          5, 10, 10, 10, 10, 10, 10,  5,
+         -5,  0,  0,  0,  0,  0,  0, -5,
+         -5,  0,  0,  0,  0,  0,  0, -5,
+         -5,  0,  0,  0,  0,  0,  0, -5,
+         -5,  0,  0,  0,  0,  0,  0, -5,
+         -5,  0,  0,  0,  0,  0,  0, -5,
+          0,  0,  0,  5,  5,  0,  0,  0,
+    ],
+    QUEEN: [
+        -20,-10,-10, -5, -5,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0,  5,  5,  5,  5,  0,-10,
+         -5,  0,  5,  5,  5,  5,  0, -5,
+          0,  0,  5,  5,  5,  5,  0, -5,
+        -10,  5,  5,  5,  5,  5,  0,-10,
+        -10,  0,  5,  0,  0,  0,  0,-10,
+        -20,-10,-10, -5, -5,-10,-10,-20,
+    ],
+    KING: [
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -20,-30,-30,-40,-40,-30,-30,-20,
+        -10,-20,-20,-20,-20,-20,-20,-10,
+         20, 20,  0,  0,  0,  0, 20, 20,
+         20, 30, 10,  0,  0, 10, 30, 20,
+    ],
+}
+
+
+def _square_table(diagram, side):
+    # [x][y] for the given side; Black reads the diagram upside down
+    table = [[0] * 8 for _ in range(8)]
+    for i, v in enumerate(diagram):
+        x, y = i % 8, 7 - i // 8
+        table[x][y if side == 0 else 7 - y] = v
+    return table
+
+
+# PST[piece.index][x][y]: material plus square bonus, positive for the
+# piece's own side
+PST = [[[PIECE_VALUES[kind] + v for v in col]
+        for col in _square_table(_PST_DIAGRAMS[kind], side)]
+       for side in (0, 1) for kind in range(6)]
+
+# PST with Black's entries negated, so one sum gives White's score
+PST_WHITE = [[[v if i < 6 else -v for v in col] for col in PST[i]] for i in range(12)]
+
+# Game phase: 24 with all minor and major pieces on, 0 with none
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0]
+MAX_PHASE = 24
+
+# CHESS_DEBUG=1 checks Board's running evaluation totals against a full
+# recompute whenever chess_eval.evaluate uses them
+DEBUG = bool(os.environ.get("CHESS_DEBUG"))
+
+FEN_PIECES = {"p": "Pawn", "n": "Knight", "b": "Bishop",
+              "r": "Rook", "q": "Queen", "k": "King"}
+FEN_LETTERS = "pnbrqk"  # by piece kind
+FILES = "abcdefgh"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Results of LegalMoveGenerator.game_status / Game.game_status
+ONGOING, CHECKMATE, STALEMATE = "ongoing", "checkmate", "stalemate"
+
+
+def square_name(x, y):
+    return FILES[x] + str(y + 1)
+
+
+def parse_square(name):
+    return FILES.index(name[0]), int(name[1]) - 1
+
+
+# Castling bits kept when a move starts or ends on a square
+CASTLING_MASK = [[15] * 8 for _ in range(8)]
+CASTLING_MASK[4][0] = 15 & ~3
+CASTLING_MASK[0][0] = 15 & ~2
+CASTLING_MASK[7][0] = 15 & ~1
+CASTLING_MASK[4][7] = 15 & ~12
+CASTLING_MASK[0][7] = 15 & ~8
+CASTLING_MASK[7][7] = 15 & ~4
+
+# FEN placement <-> 64 piece codes (0 = empty, piece.index + 1 otherwise)
+# at square y * 8 + x, the same layout the batch evaluator uses
+FEN_CODE_CHARS = ".PNBRQKpnbrqk"  # by code
+CASTLING_LETTERS = (("K", 1), ("Q", 2), ("k", 4), ("q", 8))
+_FEN_EXPAND = str.maketrans({str(n): "." * n for n in range(1, 9)})
+_FEN_RUNS = [("." * n, str(n)) for n in range(8, 0, -1)]
+_FEN_TO_CODE = bytearray([255]) * 256
+for _code, _ch in enumerate(FEN_CODE_CHARS):
+    _FEN_TO_CODE[ord(_ch)] = _code
+_FEN_TO_CODE = bytes(_FEN_TO_CODE)
+_CODE_TO_FEN = bytes.maketrans(bytes(range(13)), FEN_CODE_CHARS.encode())
+
+
+def parse_placement(placement):
+    s = "/".join(reversed(placement.split("/"))).translate(_FEN_EXPAND)
+    # Runs of empty squares are single digits: "44" would pass the length check
+    if len(s) != 71 or s[8::9] != "///////" or any(
+            a.isdigit() and b.isdigit() for a, b in zip(placement, placement[1:])):
+        raise ValueError(f"bad FEN placement: {placement!r}")
+    codes = s.replace("/", "").encode("ascii", "replace").translate(_FEN_TO_CODE)
+    if max(codes) > 12:
+        raise ValueError(f"bad FEN placement: {placement!r}")
+    return codes
+
+
+def placement_fen(codes):
+    s = bytes(codes).translate(_CODE_TO_FEN).decode()
+    s = "/".join(s[y * 8:y * 8 + 8] for y in range(7, -1, -1))
+    for run, digit in _FEN_RUNS:
+        s = s.replace(run, digit)
+    return s
+
+
+def parse_castling(field):
+    if field == "-":
+        return 0
+    bits = 0
+    for ch in field:
+        for letter, bit in CASTLING_LETTERS:
+            if ch == letter and not bits & bit:
+                bits |= bit
+                break
+        else:
+            raise ValueError(f"bad FEN castling field: {field!r}")
+    return bits
+
+
+# The square is behind a pawn that just moved two squares, so rank 6 with
+# White to move and rank 3 with Black to move
+def parse_en_passant(field, turn):
+    if field == "-":
+        return None
+    if len(field) == 2 and field[0] in FILES and field[1] == ("6" if turn == "White" else "3"):
+        return parse_square(field)
+    raise ValueError(f"bad FEN en-passant square: {field!r}")
+
+
+def castling_fen(bits):
+    return "".join(letter for letter, bit in CASTLING_LETTERS if bits & bit) or "-"
+
+
+# FEN -> (codes, turn, castling bits, en-passant (x, y) or None, halfmove
+# clock, fullmove number). Missing trailing fields take their defaults.
+def parse_fen(fen):
+    fields = fen.split()
+    if not 1 <= len(fields) <= 6:
+        raise ValueError(f"bad FEN: {fen!r}")
+    fields += ["w", "-", "-", "0", "1"][len(fields) - 1:]
+    placement, turn, castling, ep, halfmove, fullmove = fields
+    if turn not in ("w", "b"):
+        raise ValueError(f"bad FEN side to move: {turn!r}")
+    turn = "White" if turn == "w" else "Black"
+    return (parse_placement(placement), turn, parse_castling(castling),
+            parse_en_passant(ep, turn), int(halfmove), int(fullmove))
+
+
+# Inverse of parse_fen; leaving out the counters gives the 4-field EPD form
+def format_fen(codes, turn, castling, ep, halfmove=None, fullmove=None):
+    fen = " ".join((placement_fen(codes), "w" if turn == "White" else "b",
+                    castling_fen(castling), square_name(*ep) if ep else "-"))
+    if halfmove is None:
+        return fen
+    return f"{fen} {halfmove} {fullmove}"
+
+
 class Square:
+    __slots__ = ("x", "y", "piece")
+
     def __init__(self, x, y, piece=None):
         self.x = x
         self.y = y
@@ -9,20 +272,36 @@ class Square:
 
 
 class Piece:
+    __slots__ = ("color", "name", "side", "kind", "index")
+    _shared = {}
+
+    # Pieces are immutable flyweights: Piece("White", "Pawn") always returns
+    # the same instance, so the engine can compare pieces with "is"
+    def __new__(cls, color, name):
+        p = cls._shared.get((color, name))
+        if p is None:
+            p = object.__new__(cls)
+            cls._shared[(color, name)] = p
+        return p
+
     def __init__(self, color, name):
         self.color = color
         self.name = name
+        self.side = COLOR_INDEX[color]
+        self.kind = KIND_INDEX[name]
+        self.index = self.side * 6 + self.kind
 
     def get_moves(self, board, square, state):
         moves = []
         x, y = square.x, square.y
-        color = self.color
-        opp = "Black" if color == "White" else "White"
+        side = self.side
+        kind = self.kind
+        opp = 1 - side
 
         # Pawn
-        if self.name == "Pawn":
-            d = 1 if color == "White" else -1
-            start_y = 1 if color == "White" else 6
+        if kind == PAWN:
+            d = 1 if side == WHITE else -1
+            start_y = 1 if side == WHITE else 6
 
             # Forward
             if 0 <= y + d < 8 and board.squares[x][y + d].piece is None:
@@ -36,7 +315,7 @@ class Piece:
                 ny = y + d
                 if 0 <= nx < 8 and 0 <= ny < 8:
                     t = board.squares[nx][ny]
-                    if t.piece and t.piece.color == opp:
+                    if t.piece and t.piece.side == opp:
                         moves.append(t)
 
             # En passant
@@ -46,16 +325,16 @@ class Piece:
                     moves.append(ep)
 
         # Knight
-        elif self.name == "Knight":
+        elif kind == KNIGHT:
             for dx, dy in [(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)]:
                 nx, ny = x + dx, y + dy
                 if 0 <= nx < 8 and 0 <= ny < 8:
                     t = board.squares[nx][ny]
-                    if not t.piece or t.piece.color == opp:
+                    if not t.piece or t.piece.side == opp:
                         moves.append(t)
 
         # Bishop
-        elif self.name == "Bishop":
+        elif kind == BISHOP:
             for dx, dy in [(1,1),(1,-1),(-1,1),(-1,-1)]:
                 nx, ny = x + dx, y + dy
                 while 0 <= nx < 8 and 0 <= ny < 8:
@@ -63,14 +342,14 @@ class Piece:
                     if not t.piece:
                         moves.append(t)
                     else:
-                        if t.piece.color == opp:
+                        if t.piece.side == opp:
                             moves.append(t)
                         break
                     nx += dx
                     ny += dy
 
         # Rook
-        elif self.name == "Rook":
+        elif kind == ROOK:
             for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
                 nx, ny = x + dx, y + dy
                 while 0 <= nx < 8 and 0 <= ny < 8:
@@ -78,14 +357,14 @@ class Piece:
                     if not t.piece:
                         moves.append(t)
                     else:
-                        if t.piece.color == opp:
+                        if t.piece.side == opp:
                             moves.append(t)
                         break
                     nx += dx
                     ny += dy
 
         # Queen
-        elif self.name == "Queen":
+        elif kind == QUEEN:
             for dx, dy in [(1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1)]:
                 nx, ny = x + dx, y + dy
                 while 0 <= nx < 8 and 0 <= ny < 8:
@@ -93,107 +372,421 @@ class Piece:
                     if not t.piece:
                         moves.append(t)
                     else:
-                        if t.piece.color == opp:
+                        if t.piece.side == opp:
                             moves.append(t)
                         break
                     nx += dx
                     ny += dy
 
         # King
-        elif self.name == "King":
+        elif kind == KING:
             for dx, dy in [(1,0),(-1,0),(0,1),(0,-1),(1,1),(1,-1),(-1,1),(-1,-1)]:
                 nx, ny = x + dx, y + dy
                 if 0 <= nx < 8 and 0 <= ny < 8:
                     t = board.squares[nx][ny]
-                    if not t.piece or t.piece.color == opp:
+                    if not t.piece or t.piece.side == opp:
                         moves.append(t)
 
             # Castling
-            y_home = 0 if color == "White" else 7
+            y_home = 0 if side == WHITE else 7
             if y == y_home and x == 4:
+                rights = state.castling_rights[self.color]
                 # King-side
-                if state.castling_rights[color]["K"]:
+                if rights["K"]:
                     if (board.squares[5][y].piece is None and
                         board.squares[6][y].piece is None):
                         rook = board.squares[7][y]
-                        if rook.piece and rook.piece.color == color and rook.piece.name == "Rook":
+                        if rook.piece and rook.piece.side == side and rook.piece.kind == ROOK:
                             moves.append(board.squares[6][y])
 
                 # Queen-side
-                if state.castling_rights[color]["Q"]:
+                if rights["Q"]:
                     if (board.squares[1][y].piece is None and
                         board.squares[2][y].piece is None and
                         board.squares[3][y].piece is None):
                         rook = board.squares[0][y]
-                        if rook.piece and rook.piece.color == color and rook.piece.name == "Rook":
+                        if rook.piece and rook.piece.side == side and rook.piece.kind == ROOK:
                             moves.append(board.squares[2][y])
 
         return moves
 
 
+
+# The 12 shared pieces, PIECES[side][kind]
+PIECES = [[Piece(color, name) for name in PIECE_NAMES] for color in COLOR_NAMES]
+
+
+def get_piece(color, name):
+    return PIECES[COLOR_INDEX[color]][KIND_INDEX[name]]
+
+
+# Piece by FEN piece code (index 0, the empty square, is None)
+PIECE_CODES = [None] + PIECES[WHITE] + PIECES[BLACK]
+
+
 class Board:
     def __init__(self):
         self.squares = [[Square(x,y) for y in range(8)] for x in range(8)]
+        # One record per make_move, popped by unmake_move
+        self.undo_stack = []
+        # Zobrist hash of the piece placement; GameState hashes the rest
+        self.zobrist = 0
+        # Running evaluation totals, kept by put_piece / remove_piece:
+        # material per side (kings excluded), White's material + PST score,
+        # game phase (see PHASE_WEIGHTS), pawns per file per side and the
+        # king squares
+        self.material = [0, 0]
+        self.pst_score = 0
+        self.phase = 0
+        self.pawn_files = [[0] * 8, [0] * 8]
+        self.kings = [None, None]
+        # Squares (x, y) of every piece, by [side][kind], so generation and
+        # attack tests visit only the pieces that exist
+        self.piece_squares = [[set() for _ in range(6)] for _ in range(2)]
+
+    # All piece placement goes through these two, so subclasses can keep
+    # extra representations (e.g. bitboards) in sync
+    def put_piece(self, x, y, piece):
+        self.squares[x][y].piece = piece
+        self.zobrist ^= ZOBRIST_PIECES[piece.index][x][y]
+        kind = piece.kind
+        self.piece_squares[piece.side][kind].add((x, y))
+        self.material[piece.side] += PIECE_VALUES[kind]
+        self.pst_score += PST_WHITE[piece.index][x][y]
+        self.phase += PHASE_WEIGHTS[kind]
+        if kind == PAWN:
+            self.pawn_files[piece.side][x] += 1
+        elif kind == KING:
+            self.kings[piece.side] = (x, y)
+
+    def remove_piece(self, x, y):
+        sq = self.squares[x][y]
+        p = sq.piece
+        if p:
+            sq.piece = None
+            self.zobrist ^= ZOBRIST_PIECES[p.index][x][y]
+            kind = p.kind
+            self.piece_squares[p.side][kind].discard((x, y))
+            self.material[p.side] -= PIECE_VALUES[kind]
+            self.pst_score -= PST_WHITE[p.index][x][y]
+            self.phase -= PHASE_WEIGHTS[kind]
+            if kind == PAWN:
+                self.pawn_files[p.side][x] -= 1
+            elif kind == KING:
+                self.kings[p.side] = None
+        return p
+
+    def find_king(self, color):
+        return self.kings[COLOR_INDEX[color]]
+
+    # The running totals worked out from scratch, in the order
+    # (material, pst_score, phase, pawn_files, kings, piece_squares)
+    def compute_totals(self):
+        material = [0, 0]
+        pst_score = phase = 0
+        pawn_files = [[0] * 8, [0] * 8]
+        kings = [None, None]
+        piece_squares = [[set() for _ in range(6)] for _ in range(2)]
+        for x, column in enumerate(self.squares):
+            for y, sq in enumerate(column):
+                p = sq.piece
+                if p:
+                    piece_squares[p.side][p.kind].add((x, y))
+                    material[p.side] += PIECE_VALUES[p.kind]
+                    pst_score += PST_WHITE[p.index][x][y]
+                    phase += PHASE_WEIGHTS[p.kind]
+                    if p.kind == PAWN:
+                        pawn_files[p.side][x] += 1
+                    elif p.kind == KING:
+                        kings[p.side] = (x, y)
+        return material, pst_score, phase, pawn_files, kings, piece_squares
+
+    # Raises AssertionError if the running totals have drifted
+    def check_totals(self):
+        expected = self.compute_totals()
+        actual = (self.material, self.pst_score, self.phase, self.pawn_files, self.kings,
+                  self.piece_squares)
+        if actual != expected:
+            raise AssertionError(f"board totals {actual} != recomputed {expected}")
+
+    # Looks outward from (x, y) for pieces of by_color that attack it
+    def is_attacked(self, x, y, by_color):
+        squares = self.squares
+        side = COLOR_INDEX[by_color]
+        pieces = PIECES[side]
+        present = self.piece_squares[side]
+        pawn, knight, king = pieces[PAWN], pieces[KNIGHT], pieces[KING]
+        rook, bishop, queen = pieces[ROOK], pieces[BISHOP], pieces[QUEEN]
+
+        # Pawns attack diagonally forward, so look one rank back
+        py = y - 1 if by_color == "White" else y + 1
+        if 0 <= py < 8:
+            for px in (x - 1, x + 1):
+                if 0 <= px < 8:
+                    if squares[px][py].piece is pawn:
+                        return True
+
+        # Piece types by_color does not have are skipped
+        if present[KNIGHT]:
+            for nx, ny in KNIGHT_TABLE[x][y]:
+                if squares[nx][ny].piece is knight:
+                    return True
+
+        for nx, ny in KING_TABLE[x][y]:
+            if squares[nx][ny].piece is king:
+                return True
+
+        has_queen = present[QUEEN]
+        if present[ROOK] or has_queen:
+            for ray in ROOK_RAY_TABLE[x][y]:
+                for nx, ny in ray:
+                    p = squares[nx][ny].piece
+                    if p:
+                        if p is rook or p is queen:
+                            return True
+                        break
+
+        if not (present[BISHOP] or has_queen):
+            return False
+        for ray in BISHOP_RAY_TABLE[x][y]:
+            for nx, ny in ray:
+                p = squares[nx][ny].piece
+                if p:
+                    if p is bishop or p is queen:
+                        return True
+                    break
+
+        return False
+
+    # Returns (checkers, block, pins): the squares of pieces giving check,
+    # the squares that capture or block a single check, and for each pinned
+    # piece the set of squares it may still move to
+    def checks_and_pins(self, kx, ky, color):
+        squares = self.squares
+        side = COLOR_INDEX[color]
+        enemy = PIECES[1 - side]
+        present = self.piece_squares[1 - side]
+        checkers = []
+        block = set()
+        pins = {}
+
+        # Pawns and knights can check but never pin
+        py = ky + 1 if color == "White" else ky - 1
+        if 0 <= py < 8:
+            for px in (kx - 1, kx + 1):
+                if 0 <= px < 8:
+                    if squares[px][py].piece is enemy[PAWN]:
+                        checkers.append((px, py))
+                        block.add((px, py))
+
+        if present[KNIGHT]:
+            for nx, ny in KNIGHT_TABLE[kx][ky]:
+                if squares[nx][ny].piece is enemy[KNIGHT]:
+                    checkers.append((nx, ny))
+                    block.add((nx, ny))
+
+        queen = enemy[QUEEN]
+        for rays, slider in ((ROOK_RAY_TABLE[kx][ky], enemy[ROOK]),
+                             (BISHOP_RAY_TABLE[kx][ky], enemy[BISHOP])):
+            # No enemy piece moves along these lines
+            if not (present[slider.kind] or present[QUEEN]):
+                continue
+            for ray in rays:
+                shield = None
+                for i, (nx, ny) in enumerate(ray):
+                    p = squares[nx][ny].piece
+                    if not p:
+                        continue
+                    if p.side == side:
+                        if shield:
+                            break
+                        shield = (nx, ny)
+                        continue
+                    if p is slider or p is queen:
+                        line = ray[:i + 1]
+                        if shield:
+                            pins[shield] = set(line)
+                        else:
+                            checkers.append((nx, ny))
+                            block.update(line)
+                    break
+
+        return checkers, block, pins
+
+    # Piece codes by square, as parse_placement returns them
+    def codes(self):
+        codes = bytearray(64)
+        for x, column in enumerate(self.squares):
+            for y, sq in enumerate(column):
+                if sq.piece:
+                    codes[y * 8 + x] = sq.piece.index + 1
+        return bytes(codes)
 
     def setup_pieces(self):
         # White pieces
         order = ["Rook","Knight","Bishop","Queen","King","Bishop","Knight","Rook"]
         for i, name in enumerate(order):
-            self.squares[i][0].piece = Piece("White", name)
+            self.put_piece(i, 0, get_piece("White", name))
         for i in range(8):
-            self.squares[i][1].piece = Piece("White","Pawn")
+            self.put_piece(i, 1, get_piece("White","Pawn"))
 
         # Black pieces
         for i, name in enumerate(order):
-            self.squares[i][7].piece = Piece("Black", name)
+            self.put_piece(i, 7, get_piece("Black", name))
         for i in range(8):
-            self.squares[i][6].piece = Piece("Black","Pawn")
+            self.put_piece(i, 6, get_piece("Black","Pawn"))
 
     def move_piece(self, move):
-        f = self.squares[move.from_x][move.from_y]
+        piece = self.remove_piece(move.from_x, move.from_y)
         t = self.squares[move.to_x][move.to_y]
-        piece = f.piece
-        f.piece = None
-
-        # En passant capture
-        if move.captured and t.piece is None and piece.name == "Pawn":
-            cy = move.from_y
-            cx = move.to_x
-            self.squares[cx][cy].piece = None
-        else:
-            t.piece = None
 
-        # Place moved piece
-        t.piece = piece
+        # En passant capture (diagonal pawn move onto an empty square)
+        if piece.kind == PAWN and move.to_x != move.from_x and t.piece is None:
+            self.remove_piece(move.to_x, move.from_y)
+        elif t.piece:
+            self.remove_piece(move.to_x, move.to_y)
 
         # Promotion
         if move.promotion:
-            t.piece = Piece(piece.color, move.promotion)
+            piece = PIECES[piece.side][KIND_INDEX[move.promotion]]
+
+        # Place moved piece
+        self.put_piece(move.to_x, move.to_y, piece)
 
         # Castling
-        if piece.name == "King" and abs(move.to_x - move.from_x) == 2:
+        if piece.kind == KING and abs(move.to_x - move.from_x) == 2:
             y = move.from_y
             # King-side
             if move.to_x == 6:
-                rook_from = self.squares[7][y]
-                rook_to = self.squares[5][y]
+                rook = self.remove_piece(7, y)
+                rook_x = 5
+            else:
+                rook = self.remove_piece(0, y)
+                rook_x = 3
+            if rook:
+                self.put_piece(rook_x, y, rook)
+
+    # Applies move in place and updates state (castling rights, en passant
+    # target, turn). unmake_move restores board and state exactly.
+    def make_move(self, move, state):
+        piece = self.squares[move.from_x][move.from_y].piece
+        cap_x, cap_y = move.to_x, move.to_y
+        captured = self.squares[cap_x][cap_y].piece
+        if captured is None and piece.kind == PAWN and move.to_x != move.from_x:
+            cap_y = move.from_y
+            captured = self.squares[cap_x][cap_y].piece
+
+        castling = state.get_castling_bits()
+        self.undo_stack.append((move, piece, captured, cap_x, cap_y,
+                                castling, state.en_passant_target,
+                                state.halfmove_clock))
+
+        self.move_piece(move)
+
+        # Update castling rights; moving from or onto a king or rook home
+        # square loses the matching rights
+        rights = (castling & CASTLING_MASK[move.from_x][move.from_y]
+                  & CASTLING_MASK[move.to_x][move.to_y])
+        if rights != castling:
+            state.set_castling_bits(rights)
+
+        # EP target reset; only set when an enemy pawn could take en passant,
+        # so positions that differ in nothing else hash the same
+        ep = None
+        if piece.kind == PAWN and abs(move.to_y - move.from_y) == 2:
+            if self.has_pawn_beside(move.to_x, move.to_y, COLOR_NAMES[1 - piece.side]):
+                ep = self.squares[move.from_x][(move.from_y + move.to_y) // 2]
+        state.set_en_passant(ep)
+
+        # Plies since the last capture or pawn move, and full moves played
+        if piece.kind == PAWN or captured:
+            state.halfmove_clock = 0
+        else:
+            state.halfmove_clock += 1
+        if piece.side == BLACK:
+            state.fullmove_number += 1
+
+        state.switch_turn()
+
+    def has_pawn_beside(self, x, y, color):
+        pawn = PIECES[COLOR_INDEX[color]][PAWN]
+        for ax in (x - 1, x + 1):
+            if 0 <= ax < 8 and self.squares[ax][y].piece is pawn:
+                return True
+        return False
+
+    def unmake_move(self, state):
+        move, piece, captured, cap_x, cap_y, castling, ep, halfmove = self.undo_stack.pop()
+
+        state.switch_turn()
+        state.set_castling_bits(castling)
+        state.set_en_passant(ep)
+        state.halfmove_clock = halfmove
+        if piece.side == BLACK:
+            state.fullmove_number -= 1
+
+        # Put the castling rook back
+        if piece.kind == KING and abs(move.to_x - move.from_x) == 2:
+            y = move.from_y
+            if move.to_x == 6:
+                self.put_piece(7, y, self.remove_piece(5, y))
             else:
-                rook_from = self.squares[0][y]
-                rook_to = self.squares[3][y]
-            rook_to.piece = rook_from.piece
-            rook_from.piece = None
+                self.put_piece(0, y, self.remove_piece(3, y))
+
+        # Removing the piece on the target also drops a promoted piece
+        self.remove_piece(move.to_x, move.to_y)
+        self.put_piece(move.from_x, move.from_y, piece)
+        if captured:
+            self.put_piece(cap_x, cap_y, captured)
+
+    def generate_moves(self, color, state):
+        moves = []
+        for squares in self.piece_squares[COLOR_INDEX[color]]:
+            for x, y in squares:
+                moves.extend(self.piece_moves(x, y, state))
+        return moves
+
+    # Pseudo-legal moves of the piece on (x, y)
+    def piece_moves(self, x, y, state):
+        moves = []
+        sq = self.squares[x][y]
+        p = sq.piece
+        tgs = p.get_moves(self, sq, state)
+        is_pawn = p.kind == PAWN
+        for t in tgs:
+            captured = t.piece
+            # En passant adjust
+            if is_pawn and state.en_passant_target == t:
+                captured = self.squares[t.x][y].piece
+
+            # Promotion
+            if is_pawn and t.y in (7,0):
+                for prom in ["Queen","Rook","Bishop","Knight"]:
+                    moves.append(Move(x,y,t.x,t.y,captured,prom))
+            else:
+                moves.append(Move(x,y,t.x,t.y,captured,None))
+        return moves
 
     def clone(self):
-        b = Board()
-        for x in range(8):
-            for y in range(8):
-                p = self.squares[x][y].piece
-                if p:
-                    b.squares[x][y].piece = Piece(p.color, p.name)
+        b = self.__class__()
+        squares = self.squares
+        for side in self.piece_squares:
+            for kind_squares in side:
+                for x, y in kind_squares:
+                    b.put_piece(x, y, squares[x][y].piece)
         return b
 
 
+# Promotion piece <-> 2-bit code used by Move.pack
+PROMOTION_CODES = {"Knight": 0, "Bishop": 1, "Rook": 2, "Queen": 3}
+PROMOTION_NAMES = ["Knight", "Bishop", "Rook", "Queen"]
+PACKED_CAPTURE = 1 << 14
+PACKED_PROMOTION = 1 << 15
+
+
 class Move:
+    __slots__ = ("from_x", "from_y", "to_x", "to_y", "captured", "promotion")
+
     def __init__(self, fx, fy, tx, ty, captured=None, promotion=None):
         self.from_x = fx
         self.from_y = fy
@@ -202,6 +795,29 @@ class Move:
         self.captured = captured
         self.promotion = promotion
 
+    # 16-bit encoding: from square (bits 0-5), to square (6-11), promotion
+    # piece (12-13) and capture / promotion flags (14, 15). Squares are y*8+x.
+    def pack(self):
+        code = (self.from_y * 8 + self.from_x) | (self.to_y * 8 + self.to_x) << 6
+        if self.captured:
+            code |= PACKED_CAPTURE
+        if self.promotion:
+            code |= PROMOTION_CODES[self.promotion] << 12 | PACKED_PROMOTION
+        return code
+
+    # Inverse of pack. With a board in the position before the move, the
+    # captured piece (including an en-passant pawn) is filled in as well.
+    @staticmethod
+    def unpack(code, board=None):
+        fsq = code & 63
+        tsq = (code >> 6) & 63
+        fx, fy, tx, ty = fsq & 7, fsq >> 3, tsq & 7, tsq >> 3
+        promotion = PROMOTION_NAMES[(code >> 12) & 3] if code & PACKED_PROMOTION else None
+        captured = None
+        if board is not None and code & PACKED_CAPTURE:
+            captured = board.squares[tx][ty].piece or board.squares[tx][fy].piece
+        return Move(fx, fy, tx, ty, captured, promotion)
+
     def __eq__(self, other):
         return (
             isinstance(other, Move) and
@@ -215,6 +831,13 @@ class Move:
     def __hash__(self):
         return hash((self.from_x, self.from_y, self.to_x, self.to_y, self.promotion))
 
+    # Long algebraic notation as used by UCI, e.g. "e2e4", "e7e8q"
+    def uci(self):
+        s = square_name(self.from_x, self.from_y) + square_name(self.to_x, self.to_y)
+        if self.promotion:
+            s += "n" if self.promotion == "Knight" else self.promotion[0].lower()
+        return s
+
 
 class GameState:
     def __init__(self):
@@ -224,178 +847,439 @@ class GameState:
             "Black": {"K": True, "Q": True}
         }
         self.en_passant_target = None
+        # FEN move counters; not part of the position hash
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Zobrist hash of side to move, castling rights and en-passant file.
+        # Change rights and the en-passant target through the setters below
+        # so it stays current.
+        self.zobrist = ZOBRIST_CASTLING[15]
 
     def switch_turn(self):
         self.turn = "Black" if self.turn == "White" else "White"
+        self.zobrist ^= ZOBRIST_BLACK_TO_MOVE
+
+    # Castling rights packed as 4 bits: White K, White Q, Black K, Black Q
+    def get_castling_bits(self):
+        w = self.castling_rights["White"]
+        b = self.castling_rights["Black"]
+        return w["K"] | w["Q"] << 1 | b["K"] << 2 | b["Q"] << 3
+
+    def set_castling_bits(self, bits):
+        self.zobrist ^= ZOBRIST_CASTLING[self.get_castling_bits()] ^ ZOBRIST_CASTLING[bits]
+        w = self.castling_rights["White"]
+        b = self.castling_rights["Black"]
+        w["K"] = bool(bits & 1)
+        w["Q"] = bool(bits & 2)
+        b["K"] = bool(bits & 4)
+        b["Q"] = bool(bits & 8)
+
+    def set_en_passant(self, square):
+        if self.en_passant_target:
+            self.zobrist ^= ZOBRIST_EP_FILE[self.en_passant_target.x]
+        if square:
+            self.zobrist ^= ZOBRIST_EP_FILE[square.x]
+        self.en_passant_target = square
 
 
 class MoveGenerator:
+    # Pseudo-legal moves; the board backend does the actual work
     def generate_moves(self, board, color, state):
-        moves = []
-        for x in range(8):
-            for y in range(8):
-                sq = board.squares[x][y]
-                p = sq.piece
-                if p and p.color == color:
-                    tgs = p.get_moves(board, sq, state)
-                    for t in tgs:
-                        captured = t.piece
-                        # En passant adjust
-                        if p.name == "Pawn" and state.en_passant_target == t:
-                            captured = board.squares[t.x][y].piece
-
-                        # Promotion
-                        if p.name == "Pawn" and t.y in (7,0):
-                            for prom in ["Queen","Rook","Bishop","Knight"]:
-                                moves.append(Move(x,y,t.x,t.y,captured,prom))
-                        else:
-                            moves.append(Move(x,y,t.x,t.y,captured,None))
-        return moves
+        return board.generate_moves(color, state)
 
 
 class MoveValidator:
-    def is_in_check(self, board, color, state):
-        # find king
-        kx = ky = None
-        for x in range(8):
-            for y in range(8):
-                p = board.squares[x][y].piece
-                if p and p.color == color and p.name == "King":
-                    kx, ky = x, y
-                    break
+    def is_square_attacked(self, board, square, by_color):
+        return board.is_attacked(square.x, square.y, by_color)
 
+    def is_in_check(self, board, color, state):
+        king = board.find_king(color)
+        if king is None:
+            return False
         opp = "Black" if color == "White" else "White"
-        gen = MoveGenerator()
-        opp_moves = gen.generate_moves(board, opp, state)
-
-        for m in opp_moves:
-            if m.to_x == kx and m.to_y == ky:
-                return True
-        return False
+        kx, ky = king
+        return self.is_square_attacked(board, board.squares[kx][ky], opp)
 
     def is_legal(self, board, move, color, state):
         p = board.squares[move.from_x][move.from_y].piece
         if not p or p.color != color:
             return False
 
-        b2 = board.clone()
-        b2.move_piece(move)
-
         # cannot leave king in check
-        if self.is_in_check(b2, color, state):
+        board.make_move(move, state)
+        in_check = self.is_in_check(board, color, state)
+        board.unmake_move(state)
+        if in_check:
             return False
 
         # castling check
-        if p.name == "King" and abs(move.to_x - move.from_x) == 2:
+        if p.kind == KING and abs(move.to_x - move.from_x) == 2:
+            opp = "Black" if color == "White" else "White"
             # cannot castle from check
-            if self.is_in_check(board, color, state):
+            if self.is_square_attacked(board, board.squares[move.from_x][move.from_y], opp):
                 return False
             # cannot pass through check
             mid_x = 5 if move.to_x > move.from_x else 3
-            b3 = board.clone()
-            b3.move_piece(Move(move.from_x, move.from_y, mid_x, move.from_y))
-            if self.is_in_check(b3, color, state):
+            if self.is_square_attacked(board, board.squares[mid_x][move.from_y], opp):
                 return False
 
         return True
 
 
+class LegalMoveGenerator:
+    # Works out checkers and absolute pins against the king once per
+    # position, then keeps only the pseudo-legal moves that respect them,
+    # so no move has to be played out to be verified
+    def generate_legal_moves(self, board, color, state):
+        pseudo = board.generate_moves(color, state)
+        king = board.find_king(color)
+        if king is None:
+            return pseudo
+
+        kx, ky = king
+        opp = "Black" if color == "White" else "White"
+        squares = board.squares
+        checkers, block, pins = self.checks_and_pins(board, kx, ky, color)
+        double_check = len(checkers) > 1
+
+        legal = []
+        king_moves = []
+        for m in pseudo:
+            fx, fy, tx, ty = m.from_x, m.from_y, m.to_x, m.to_y
+            if fx == kx and fy == ky:
+                king_moves.append(m)
+                continue
+            if double_check:
+                continue
+
+            pin = pins.get((fx, fy))
+            if pin is not None and (tx, ty) not in pin:
+                continue
+
+            # En passant takes two pawns off one rank, which a pin can't
+            # describe, so play it out; it is at most two moves per position
+            if tx != fx and squares[tx][ty].piece is None and squares[fx][fy].piece.kind == PAWN:
+                board.make_move(m, state)
+                exposed = board.is_attacked(kx, ky, opp)
+                board.unmake_move(state)
+                if not exposed:
+                    legal.append(m)
+                continue
+
+            if checkers and (tx, ty) not in block:
+                continue
+            legal.append(m)
+
+        # King moves are tested with the king lifted, so sliders see through it
+        if king_moves:
+            king_piece = board.remove_piece(kx, ky)
+            for m in king_moves:
+                tx, ty = m.to_x, m.to_y
+                if abs(tx - kx) == 2:
+                    mid_x = 5 if tx > kx else 3
+                    if (checkers or board.is_attacked(mid_x, ty, opp) or
+                            board.is_attacked(tx, ty, opp)):
+                        continue
+                elif board.is_attacked(tx, ty, opp):
+                    continue
+                legal.append(m)
+            board.put_piece(kx, ky, king_piece)
+
+        return legal
+
+    # The same moves as generate_legal_moves, one piece at a time: other
+    # pieces first, whose moves only need the pin and check sets, then the
+    # king, whose targets need attack tests. The board must be back in the
+    # same position whenever the generator is resumed.
+    def iter_legal_moves(self, board, color, state):
+        king = board.find_king(color)
+        if king is None:
+            yield from board.generate_moves(color, state)
+            return
+
+        kx, ky = king
+        opp = "Black" if color == "White" else "White"
+        side = COLOR_INDEX[color]
+        squares = board.squares
+        checkers, block, pins = self.checks_and_pins(board, kx, ky, color)
+
+        if len(checkers) < 2:
+            # Copied, as the caller may play moves between yields
+            origins = [sq for kind in range(KING) for sq in board.piece_squares[side][kind]]
+            for fx, fy in origins:
+                p = squares[fx][fy].piece
+                pin = pins.get((fx, fy))
+                for m in board.piece_moves(fx, fy, state):
+                    tx, ty = m.to_x, m.to_y
+                    if pin is not None and (tx, ty) not in pin:
+                        continue
+                    if tx != fx and squares[tx][ty].piece is None and p.kind == PAWN:
+                        board.make_move(m, state)
+                        exposed = board.is_attacked(kx, ky, opp)
+                        board.unmake_move(state)
+                        if not exposed:
+                            yield m
+                        continue
+                    if checkers and (tx, ty) not in block:
+                        continue
+                    yield m
+
+        for m in board.piece_moves(kx, ky, state):
+            tx, ty = m.to_x, m.to_y
+            king_piece = board.remove_piece(kx, ky)
+            if abs(tx - kx) == 2:
+                mid_x = 5 if tx > kx else 3
+                ok = not (checkers or board.is_attacked(mid_x, ty, opp) or
+                          board.is_attacked(tx, ty, opp))
+            else:
+                ok = not board.is_attacked(tx, ty, opp)
+            board.put_piece(kx, ky, king_piece)
+            if ok:
+                yield m
+
+    # Stops at the first legal move found
+    def has_any_legal_move(self, board, color, state):
+        return next(self.iter_legal_moves(board, color, state), None) is not None
+
+    # ONGOING, CHECKMATE or STALEMATE for the side to move
+    def game_status(self, board, color, state):
+        if self.has_any_legal_move(board, color, state):
+            return ONGOING
+        king = board.find_king(color)
+        if king is not None and self.checks_and_pins(board, king[0], king[1], color)[0]:
+            return CHECKMATE
+        return STALEMATE
+
+    # Returns (checkers, block, pins) for color's king on (kx, ky); see
+    # Board.checks_and_pins
+    def checks_and_pins(self, board, kx, ky, color):
+        return board.checks_and_pins(kx, ky, color)
+
+
 class History:
-    def __init__(self):
+    # With packed=True, moves are stored as 16-bit Move.pack() codes
+    def __init__(self, packed=False):
+        self.packed = packed
         self.moves = []
+        # Zobrist hash -> number of times the position has occurred
         self.positions = {}
 
     def record_move(self, move, board, state):
-        self.moves.append(move)
-        key = self.get_position_key(board, state)
+        self.moves.append(move.pack() if self.packed else move)
+        self.record_position(board, state)
+
+    # Moves as Move objects whichever way they are stored (captured pieces
+    # are not kept in packed form)
+    def iter_moves(self):
+        if not self.packed:
+            return iter(self.moves)
+        return (Move.unpack(code) for code in self.moves)
+
+    def record_position(self, board, state):
+        key = board.zobrist ^ state.zobrist
         self.positions[key] = self.positions.get(key, 0) + 1
 
+    def repetitions(self, board, state):
+        return self.positions.get(board.zobrist ^ state.zobrist, 0)
+
+    # The position as FEN without the move counters
     def get_position_key(self, board, state):
-        rows = []
-        for y in range(7, -1, -1):
-            row = ""
-            for x in range(8):
-                p = board.squares[x][y].piece
-                if not p:
-                    row += "."
-                else:
-                    c = p.name[0]
-                    row += c.lower() if p.color == "Black" else c.upper()
-            rows.append(row)
-
-        key = "/".join(rows)
-        key += " " + state.turn[0]
-        return key
+        ep = state.en_passant_target
+        return format_fen(board.codes(), state.turn, state.get_castling_bits(),
+                          (ep.x, ep.y) if ep else None)
 
 
 class Game:
-    def __init__(self):
-        self.board = Board()
+    def __init__(self, board_class=Board):
+        # board_class selects the backend (Board or chess_bitboard.BitBoard)
+        self.board_class = board_class
+        self.board = board_class()
         self.state = GameState()
         self.history = History()
         self.gen = MoveGenerator()
         self.val = MoveValidator()
+        self.legal_gen = LegalMoveGenerator()
+
+        # Legal moves for the current position, built on first use and
+        # dropped whenever the position changes
+        self._legal_moves = None
+        self._legal_set = None
+        self._legal_by_origin = None
 
         self.game_over = False
         self.game_over_reason = ""
         self.winner = None
+        # FEN the game started from, for replaying its history
+        self.start_fen = None
 
     def start_game(self):
+        self.start_fen = START_FEN
         self.board.setup_pieces()
+        self.history.record_position(self.board, self.state)
+        self._clear_legal_cache()
+
+    # Replaces the game with a position given in FEN
+    def load_fen(self, fen):
+        self.set_position(*parse_fen(fen))
+
+    # Replaces the game with a position given as piece codes (see
+    # parse_fen for the arguments)
+    def set_position(self, codes, turn="White", castling=15, ep=None,
+                     halfmove=0, fullmove=1):
+        # Checked before anything is replaced, so a bad position leaves the
+        # game as it was
+        if codes.count(KING + 1) != 1 or codes.count(7 + KING) != 1:
+            raise ValueError("bad position: each side needs exactly one king")
+        if any(codes[sq] in (PAWN + 1, 7 + PAWN) for sq in (*range(8), *range(56, 64))):
+            raise ValueError("bad position: pawn on the first or last rank")
+        if halfmove < 0 or fullmove < 1:
+            raise ValueError(f"bad position: move counters {halfmove} {fullmove}")
+        board = self.board_class()
+        put = board.put_piece
+        for sq, code in enumerate(codes):
+            if code:
+                put(sq & 7, sq >> 3, PIECE_CODES[code])
+        waiting = "Black" if turn == "White" else "White"
+        if board.is_attacked(*board.find_king(waiting), turn):
+            raise ValueError(f"bad position: {waiting} is in check but not to move")
+
+        self.board = board
+        self.state = GameState()
+        self.history = History()
+        self.game_over = False
+        self.game_over_reason = ""
+        self.winner = None
+        self.start_fen = format_fen(codes, turn, castling, ep, halfmove, fullmove)
+
+        if turn == "Black":
+            self.state.switch_turn()
+        self.state.set_castling_bits(castling)
+        self.state.halfmove_clock = halfmove
+        self.state.fullmove_number = fullmove
+
+        # Keep the en-passant square only if it can be used, as make_move does
+        if ep:
+            ex, ey = ep
+            pawn_y = ey - 1 if self.state.turn == "White" else ey + 1
+            if self.board.has_pawn_beside(ex, pawn_y, self.state.turn):
+                self.state.set_en_passant(self.board.squares[ex][ey])
+
+        self.history.record_position(self.board, self.state)
+        self._clear_legal_cache()
+        self._check_end()
 
+    def fen(self):
+        s = self.state
+        ep = s.en_passant_target
+        return format_fen(self.board.codes(), s.turn, s.get_castling_bits(),
+                          (ep.x, ep.y) if ep else None,
+                          s.halfmove_clock, s.fullmove_number)
+
+    # Independent copy of the position and history (not the undo stack), for
+    # searching or analysing without touching this game
+    def copy(self):
+        g = Game(self.board_class)
+        g.board = self.board.clone()
+        s = g.state
+        s.turn = self.state.turn
+        s.set_castling_bits(self.state.get_castling_bits())
+        s.zobrist = self.state.zobrist
+        ep = self.state.en_passant_target
+        s.en_passant_target = g.board.squares[ep.x][ep.y] if ep else None
+        s.halfmove_clock = self.state.halfmove_clock
+        s.fullmove_number = self.state.fullmove_number
+        g.history.packed = self.history.packed
+        g.history.moves = list(self.history.moves)
+        g.history.positions = dict(self.history.positions)
+        g.game_over = self.game_over
+        g.game_over_reason = self.game_over_reason
+        g.winner = self.winner
+        g.start_fen = self.start_fen
+        return g
+
+    def _clear_legal_cache(self):
+        self._legal_moves = None
+        self._legal_set = None
+        self._legal_by_origin = None
+
+    # The returned list is cached; callers must not modify it
     def get_legal_moves_for_current_player(self):
-        color = self.state.turn
-        pseudo = self.gen.generate_moves(self.board, color, self.state)
-        return [m for m in pseudo if self.val.is_legal(self.board, m, color, self.state)]
+        if self._legal_moves is None:
+            moves = self.legal_gen.generate_legal_moves(self.board, self.state.turn, self.state)
+            by_origin = {}
+            for m in moves:
+                by_origin.setdefault((m.from_x, m.from_y), []).append(m)
+            self._legal_moves = moves
+            self._legal_set = set(moves)
+            self._legal_by_origin = by_origin
+        return self._legal_moves
+
+    def is_legal_move(self, move):
+        if self._legal_set is None:
+            self.get_legal_moves_for_current_player()
+        return move in self._legal_set
+
+    def get_legal_moves_from(self, x, y):
+        if self._legal_by_origin is None:
+            self.get_legal_moves_for_current_player()
+        return self._legal_by_origin.get((x, y), [])
+
+    # The legal move written in UCI notation (e.g. "e2e4", "e7e8q"), or None
+    def move_from_uci(self, uci):
+        if len(uci) not in (4, 5):
+            return None
+        try:
+            fx, fy = parse_square(uci[:2])
+            tx, ty = parse_square(uci[2:4])
+        except (ValueError, IndexError):
+            return None
+        for m in self.get_legal_moves_from(fx, fy):
+            if m.to_x == tx and m.to_y == ty and m.uci() == uci:
+                return m
+        return None
 
     def make_move(self, move):
         if self.game_over:
             return False
 
-        color = self.state.turn
-        opp = "Black" if color == "White" else "White"
-
-        if move not in self.get_legal_moves_for_current_player():
+        if not self.is_legal_move(move):
             return False
 
-        p = self.board.squares[move.from_x][move.from_y].piece
-
-        # Apply move
-        self.board.move_piece(move)
-
-        # Update castling rights
-        if p.name == "King":
-            self.state.castling_rights[color]["K"] = False
-            self.state.castling_rights[color]["Q"] = False
-
-        if p.name == "Rook":
-            home_y = 0 if color == "White" else 7
-            if move.from_y == home_y:
-                if move.from_x == 0:
-                    self.state.castling_rights[color]["Q"] = False
-                elif move.from_x == 7:
-                    self.state.castling_rights[color]["K"] = False
-
-        # EP target reset
-        self.state.en_passant_target = None
-        if p.name == "Pawn" and abs(move.to_y - move.from_y) == 2:
-            mid = (move.from_y + move.to_y)//2
-            self.state.en_passant_target = self.board.squares[move.from_x][mid]
+        self.apply_move(move)
+        return True
 
+    # Plays a move already known to be legal, even once the game is over;
+    # for replaying records that play on past an unclaimed repetition
+    def apply_move(self, move):
+        self.board.make_move(move, self.state)
+        self._clear_legal_cache()
         self.history.record_move(move, self.board, self.state)
-
-        self.state.switch_turn()
-        
         self._check_end()
-        return True
+
+    # PGN result string: "1-0", "0-1", "1/2-1/2" or "*" while in progress
+    def result(self):
+        if not self.game_over:
+            return "*"
+        if self.winner == "White":
+            return "1-0"
+        if self.winner == "Black":
+            return "0-1"
+        return "1/2-1/2"
+
+    # ONGOING, CHECKMATE or STALEMATE for the side to move, ignoring
+    # repetition; uses the legal move list if it is already cached
+    def game_status(self):
+        if self._legal_moves:
+            return ONGOING
+        return self.legal_gen.game_status(self.board, self.state.turn, self.state)
 
     def _check_end(self):
-        moves = self.get_legal_moves_for_current_player()
+        status = self.game_status()
         color = self.state.turn
 
         # No legal moves
-        if not moves:
-            if self.val.is_in_check(self.board, color, self.state):
+        if status != ONGOING:
+            if status == CHECKMATE:
                 self.game_over = True
                 opp = "Black" if color == "White" else "White"
                 self.winner = opp
@@ -404,3 +1288,50 @@ class Game:
                 self.game_over = True
                 self.winner = None
                 self.game_over_reason = "Stalemate"
+
+        # Threefold repetition
+        elif self.history.repetitions(self.board, self.state) >= 3:
+            self.game_over = True
+            self.winner = None
+            self.game_over_reason = "Draw by threefold repetition"
+
+
+# --- Perft (see chess_perft.py for the standard suite) ---
+
+# Counts leaf nodes of the legal move tree to the given depth
+def perft(game, depth):
+    if depth <= 0:
+        return 1
+    board, state, legal_gen = game.board, game.state, game.legal_gen
+    return _perft(board, state, legal_gen, depth)
+
+
+def _perft(board, state, legal_gen, depth):
+    moves = legal_gen.generate_legal_moves(board, state.turn, state)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for m in moves:
+        board.make_move(m, state)
+        nodes += _perft(board, state, legal_gen, depth - 1)
+        board.unmake_move(state)
+    return nodes
+
+
+# Perft split by root move: {uci string: nodes}; empty below depth 1
+def divide(game, depth):
+    board, state = game.board, game.state
+    counts = {}
+    if depth <= 0:
+        return counts
+    for m in game.legal_gen.generate_legal_moves(board, state.turn, state):
+        board.make_move(m, state)
+        counts[m.uci()] = perft(game, depth - 1)
+        board.unmake_move(state)
+    return counts
+
+
+# CHESS_PROFILE=1 (or =report.json) turns on chess_profile's instrumentation
+if os.environ.get("CHESS_PROFILE"):
+    import chess_profile
+    chess_profile.enable_from_env()
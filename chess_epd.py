@@ -0,0 +1,203 @@
+# chess_epd.py
+# Bulk FEN/EPD loading: streams positions from large files as compact records
+# instead of full Game objects
+#
+# Each line holds one position: a FEN (4 to 6 fields), or EPD (4 fields
+# followed by operations such as 'bm e4; id "WAC.001";'). Perft files in the
+# common ';D1 20 ;D2 400' style are EPD too.
+#
+# Usage:
+#   python chess_epd.py positions.epd              # count and time a file
+#   python chess_epd.py perftsuite.epd --perft 3   # check D1..D3 counts
+
+import argparse
+import sys
+import time
+
+from chess_engine import (Board, Game, format_fen, parse_castling,
+                          parse_en_passant, parse_placement, perft)
+
+
+class Position:
+    """One position: 64 piece codes plus the FEN/EPD fields."""
+    __slots__ = ("codes", "turn", "castling", "ep", "halfmove", "fullmove", "ops", "quoted")
+
+    def __init__(self, codes, turn="White", castling=0, ep=None,
+                 halfmove=0, fullmove=1, ops=None, quoted=None):
+        self.codes = codes
+        self.turn = turn
+        self.castling = castling
+        self.ep = ep
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+        # EPD operations, opcode -> operand string
+        self.ops = ops if ops is not None else {}
+        # Opcodes whose operand is a string, written back in quotes
+        self.quoted = quoted if quoted is not None else set()
+
+    def fen(self):
+        return format_fen(self.codes, self.turn, self.castling, self.ep,
+                          self.halfmove, self.fullmove)
+
+    def epd(self):
+        fen = format_fen(self.codes, self.turn, self.castling, self.ep)
+        ops = []
+        for op, value in self.ops.items():
+            if op in self.quoted:
+                value = '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+            ops.append(f" {op} {value};" if value else f" {op};")
+        return fen + "".join(ops)
+
+    def to_game(self, board_class=Board):
+        """A full Game set up at this position."""
+        game = Game(board_class)
+        game.set_position(self.codes, self.turn, self.castling, self.ep,
+                          self.halfmove, self.fullmove)
+        return game
+
+
+def _split_ops(text):
+    # Operations end at ';', except inside a quoted string operand, where
+    # a backslash escapes the next character
+    parts = []
+    start = 0
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if escaped:
+            escaped = False
+        elif in_string and ch == "\\":
+            escaped = True
+        elif ch == '"':
+            in_string = not in_string
+        elif ch == ";" and not in_string:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(value):
+    """The contents of value if it is exactly one quoted string, else None."""
+    if not value.startswith('"'):
+        return None
+    chars = []
+    escaped = False
+    for i in range(1, len(value)):
+        ch = value[i]
+        if escaped:
+            chars.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            return "".join(chars) if i == len(value) - 1 else None
+        else:
+            chars.append(ch)
+    return None
+
+
+def _parse_ops(text):
+    """(opcode -> operand, opcodes whose operand was a quoted string)."""
+    ops = {}
+    quoted = set()
+    for op in _split_ops(text):
+        op = op.strip()
+        if op:
+            opcode, _, value = op.partition(" ")
+            value = value.strip()
+            string = _unquote(value)
+            if string is not None:
+                value = string
+                quoted.add(opcode)
+            else:
+                quoted.discard(opcode)
+            ops[opcode] = value
+    return ops, quoted
+
+
+def parse_line(line):
+    """Parses one FEN or EPD line; returns None for blank and '#' lines."""
+    fields = line.split(None, 4)
+    if not fields or fields[0].startswith("#"):
+        return None
+    if len(fields) < 4:
+        raise ValueError(f"bad FEN/EPD line: {line.strip()!r}")
+    placement, turn, castling, ep = fields[:4]
+    if turn not in ("w", "b"):
+        raise ValueError(f"bad FEN side to move: {turn!r}")
+
+    # What follows the fourth field is either FEN move counters, EPD
+    # operations, or counters then operations
+    halfmove, fullmove = 0, 1
+    ops, quoted = {}, set()
+    if len(fields) == 5:
+        head, _, tail = fields[4].partition(";")
+        counters = head.split()
+        if len(counters) == 2 and counters[0].isdigit() and counters[1].isdigit():
+            halfmove, fullmove = int(counters[0]), int(counters[1])
+            ops, quoted = _parse_ops(tail)
+        else:
+            ops, quoted = _parse_ops(fields[4])
+            halfmove = int(ops.get("hmvc", 0))
+            fullmove = int(ops.get("fmvn", 1))
+
+    turn = "White" if turn == "w" else "Black"
+    return Position(parse_placement(placement), turn, parse_castling(castling),
+                    parse_en_passant(ep, turn), halfmove, fullmove, ops, quoted)
+
+
+def iter_positions(source, skip_errors=False):
+    """Yields a Position per line of source (a path or an open text file),
+    reading lazily. Malformed lines raise ValueError unless skip_errors."""
+    if isinstance(source, str):
+        with open(source) as f:
+            yield from iter_positions(f, skip_errors)
+        return
+    for number, line in enumerate(source, 1):
+        try:
+            pos = parse_line(line)
+        except ValueError as e:
+            if skip_errors:
+                continue
+            raise ValueError(f"line {number}: {e}") from None
+        if pos is not None:
+            yield pos
+
+
+def check_perft(source, max_depth, board_class=Board, out=sys.stdout):
+    """Checks the D<n> operations of a perft EPD file up to max_depth;
+    returns True if every count matches."""
+    ok = True
+    for pos in iter_positions(source):
+        game = pos.to_game(board_class)
+        for depth in range(1, max_depth + 1):
+            expected = pos.ops.get(f"D{depth}")
+            if expected is None:
+                break
+            nodes = perft(game, depth)
+            if nodes != int(expected):
+                ok = False
+                print(f"{pos.fen()}  depth {depth}: {nodes}, expected {expected}", file=out)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load FEN/EPD files")
+    parser.add_argument("path")
+    parser.add_argument("--perft", type=int, metavar="DEPTH",
+                        help="check the file's D1..DEPTH perft counts")
+    parser.add_argument("--skip-errors", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.perft:
+        return 0 if check_perft(args.path, args.perft) else 1
+
+    t0 = time.perf_counter()
+    count = sum(1 for _ in iter_positions(args.path, args.skip_errors))
+    secs = time.perf_counter() - t0
+    print(f"{count} positions in {secs:.3f}s ({count / secs if secs else 0:,.0f}/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# chess_eval.py
+# Static evaluation for chess_engine boards: material plus piece-square tables
+#
+# evaluate() reads the material + PST total that Board keeps as pieces move,
+# so it costs the same in every position; evaluate_structure() adds pawn
+# terms from the board's pawn file counts. evaluate_batch() scores many
+# positions at once with NumPy, given as an N x 64 array of piece codes
+# (0 = empty, piece.index + 1 otherwise; square index y * 8 + x) or as
+# N x 12 x 64 piece planes, and adds mobility and pawn-structure terms.
+
+try:
+    import numpy as np
+except ImportError:  # only the batch evaluator needs NumPy
+    np = None
+
+from chess_engine import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN,
+                          KNIGHT_DELTAS, ROOK_DIRS, BISHOP_DIRS,
+                          PIECE_VALUES, PST, DEBUG)
+
+# PIECE_VALUES and PST (piece-square tables, material included) live in
+# chess_engine, whose Board keeps their running total as pieces move
+
+
+def evaluate(board):
+    """Score in centipawns from White's point of view."""
+    if DEBUG:
+        board.check_totals()
+    return board.pst_score
+
+
+def evaluate_structure(board):
+    """evaluate() plus doubled and isolated pawn terms from the board's
+    pawn file counts; a drop-in Searcher evaluate."""
+    if DEBUG:
+        board.check_totals()
+    score = board.pst_score
+    for side, sign in ((0, 1), (1, -1)):
+        files = board.pawn_files[side]
+        for x in range(8):
+            n = files[x]
+            if n:
+                if n > 1:
+                    score += sign * DOUBLED_PAWN * (n - 1)
+                if not ((x > 0 and files[x - 1]) or (x < 7 and files[x + 1])):
+                    score += sign * ISOLATED_PAWN * n
+    return score
+
+
+def evaluate_for(board, color):
+    """Score from the point of view of color ("White" or "Black")."""
+    score = evaluate(board)
+    return score if color == "White" else -score
+
+
+# --- NumPy batch evaluation ---
+
+# Centipawns per pseudo-legal move, indexed by piece kind
+MOBILITY_WEIGHTS = [0, 4, 5, 2, 1, 0]
+DOUBLED_PAWN = -10
+ISOLATED_PAWN = -15
+# Passed pawn bonus by rank counted from the pawn's own side
+PASSED_PAWN = [0, 5, 10, 20, 35, 60, 100, 0]
+
+
+def encode(board):
+    """Piece codes for one board as 64 bytes (see Board.codes)."""
+    return board.codes()
+
+
+def encode_batch(boards):
+    """N x 64 int8 array of piece codes."""
+    if np is None:
+        raise ImportError("encode_batch needs NumPy")
+    return np.frombuffer(b"".join(b.codes() for b in boards), dtype=np.int8).reshape(-1, 64)
+
+
+def to_planes(codes):
+    """N x 64 codes -> N x 12 x 64 uint8 piece planes."""
+    if np is None:
+        raise ImportError("to_planes needs NumPy")
+    codes = np.asarray(codes)
+    return (codes[:, None, :] == np.arange(1, 13, dtype=codes.dtype)[None, :, None]).astype(np.uint8)
+
+
+def to_codes(planes):
+    """N x 12 x 64 piece planes -> N x 64 codes."""
+    if np is None:
+        raise ImportError("to_codes needs NumPy")
+    planes = np.asarray(planes)
+    idx = np.argmax(planes, axis=1) + 1
+    return np.where(planes.any(axis=1), idx, 0).astype(np.int8)
+
+
+def _build_tables():
+    # Signed material + PST by code (row 0 is the empty square)
+    pst = np.zeros((13, 64), dtype=np.int32)
+    for index in range(12):
+        sign = 1 if index < 6 else -1
+        for x in range(8):
+            for y in range(8):
+                pst[index + 1, y * 8 + x] = sign * PST[index][x][y]
+
+    # One-step targets per direction (64 = off the board)
+    def steps(dirs):
+        table = np.full((len(dirs), 64), 64, dtype=np.intp)
+        for d, (dx, dy) in enumerate(dirs):
+            for sq in range(64):
+                x, y = sq % 8, sq // 8
+                if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                    table[d, sq] = (y + dy) * 8 + x + dx
+        return table
+
+    # Gather indices for one slider step: for each target square (plus the
+    # off-board pad column 64), the square a step in that direction came from
+    def sources(dirs):
+        step_table = steps(dirs)
+        src = np.full((len(dirs), 65), 64, dtype=np.intp)
+        for d in range(len(dirs)):
+            for sq in range(64):
+                if step_table[d, sq] < 64:
+                    src[d, step_table[d, sq]] = sq
+        return src
+
+    knight = np.zeros((64, 64), dtype=np.float32)  # float for a BLAS matmul
+    for targets in steps(KNIGHT_DELTAS):
+        for sq, t in enumerate(targets):
+            if t < 64:
+                knight[sq, t] = 1
+    return pst, knight, sources(ROOK_DIRS), sources(BISHOP_DIRS)
+
+
+_TABLES = None
+
+
+def _tables():
+    global _TABLES
+    if _TABLES is None:
+        _TABLES = _build_tables()
+    return _TABLES
+
+
+def _slider_mobility(weights, empty, not_own, src):
+    # weights, empty, not_own: N x 65 (column 64 is the off-board pad);
+    # weights holds each slider's mobility weight on its square. Walk every
+    # ray one step at a time; a ray continues only over empty squares.
+    # Rays moving the same way never overlap, so weights can be summed.
+    total = np.zeros(weights.shape[0], dtype=np.int32)
+    for d in range(src.shape[0]):
+        cur = weights
+        for _ in range(7):
+            cur = cur[:, src[d]]
+            if not cur.any():
+                break
+            total += (cur * not_own).sum(axis=1, dtype=np.int32)
+            cur = cur * empty
+    return total
+
+
+def _passed(own, enemy, forward):
+    # own, enemy: N x 8 ranks x 8 files pawn masks, from White's side if
+    # forward is +1. A pawn is passed if no enemy pawn is ahead of it on its
+    # own or an adjacent file.
+    span = enemy.copy()
+    span[:, :, 1:] |= enemy[:, :, :-1]
+    span[:, :, :-1] |= enemy[:, :, 1:]
+    if forward < 0:
+        span = span[:, ::-1, :]
+        own = own[:, ::-1, :]
+    # any enemy on a higher rank
+    ahead = np.flip(np.logical_or.accumulate(np.flip(span, axis=1), axis=1), axis=1)
+    ahead = np.concatenate([ahead[:, 1:, :], np.zeros_like(ahead[:, :1, :])], axis=1)
+    passed = own & ~ahead
+    return (passed.sum(axis=2) * np.array(PASSED_PAWN, dtype=np.int32)).sum(axis=1)
+
+
+def evaluate_terms(positions):
+    """Per-term White-relative scores for a batch: a dict of int32 arrays
+    ("material_pst", "mobility", "pawns")."""
+    if np is None:
+        raise ImportError("evaluate_terms needs NumPy")
+    positions = np.asarray(positions)
+    codes = to_codes(positions) if positions.ndim == 3 else positions.astype(np.intp)
+    codes = codes.astype(np.intp)
+    n = codes.shape[0]
+    pst, knight, rook_src, bishop_src = _tables()
+
+    material_pst = pst[codes, np.arange(64)].sum(axis=1)
+
+    pad = np.zeros((n, 1), dtype=bool)
+    occupied = np.concatenate([codes > 0, pad], axis=1)
+    empty = ~occupied
+    mobility = np.zeros(n, dtype=np.int32)
+    for side, sign in ((0, 1), (1, -1)):
+        base = side * 6 + 1
+        own = np.concatenate([(codes >= base) & (codes < base + 6), pad], axis=1)
+        not_own = ~own
+        not_own[:, 64] = False
+
+        knights = (codes == base + KNIGHT).astype(np.float32)
+        reach = (knights @ knight) * not_own[:, :64]
+        m = MOBILITY_WEIGHTS[KNIGHT] * reach.sum(axis=1).astype(np.int32)
+
+        # Mobility weight of each slider by the directions it moves in
+        weight = np.zeros((13, 2), dtype=np.int16)
+        weight[base + ROOK, 0] = MOBILITY_WEIGHTS[ROOK]
+        weight[base + BISHOP, 1] = MOBILITY_WEIGHTS[BISHOP]
+        weight[base + QUEEN] = MOBILITY_WEIGHTS[QUEEN]
+        sliders = np.concatenate([weight[codes], np.zeros((n, 1, 2), dtype=np.int16)], axis=1)
+        m += _slider_mobility(sliders[:, :, 0], empty, not_own, rook_src)
+        m += _slider_mobility(sliders[:, :, 1], empty, not_own, bishop_src)
+        mobility += sign * m
+
+    grid = codes.reshape(n, 8, 8)  # [rank y][file x]
+    white_pawns = grid == PAWN + 1
+    black_pawns = grid == 6 + PAWN + 1
+    pawns = np.zeros(n, dtype=np.int32)
+    for own, enemy, sign, forward in ((white_pawns, black_pawns, 1, 1),
+                                      (black_pawns, white_pawns, -1, -1)):
+        files = own.sum(axis=1)
+        doubled = np.maximum(files - 1, 0).sum(axis=1)
+        has = files > 0
+        neighbours = np.zeros_like(has)
+        neighbours[:, 1:] |= has[:, :-1]
+        neighbours[:, :-1] |= has[:, 1:]
+        isolated = (files * ~neighbours).sum(axis=1)
+        pawns += sign * (DOUBLED_PAWN * doubled + ISOLATED_PAWN * isolated +
+                         _passed(own, enemy, forward))
+
+    return {"material_pst": material_pst.astype(np.int32),
+            "mobility": mobility, "pawns": pawns}
+
+
+def evaluate_batch(positions, chunk=4096):
+    """White-relative scores (int32 array) for N x 64 codes or N x 12 x 64
+    planes, worked through in chunks to keep temporaries small."""
+    if np is None:
+        raise ImportError("evaluate_batch needs NumPy")
+    positions = np.asarray(positions)
+    out = np.empty(positions.shape[0], dtype=np.int32)
+    for i in range(0, positions.shape[0], chunk):
+        terms = evaluate_terms(positions[i:i + chunk])
+        out[i:i + chunk] = terms["material_pst"] + terms["mobility"] + terms["pawns"]
+    return out
+
+
+def evaluate_position(board):
+    """evaluate_batch for a single board, e.g. as the evaluator for search."""
+    if np is None:
+        raise ImportError("evaluate_position needs NumPy")
+    return int(evaluate_batch(np.frombuffer(encode(board), dtype=np.int8)[None, :])[0])
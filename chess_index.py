@@ -0,0 +1,253 @@
+# chess_index.py
+# On-disk position index: how often each position occurred and with what
+# results, stored as sorted fixed-size records and searched through mmap
+#
+# File layout (little-endian):
+#   header  8s magic, u16 version, u16 key scheme, u64 record count
+#   records u64 key, u32 count, u32 white wins, u32 draws, u32 black wins
+#
+# Keys are the Zobrist position hash, or with KEY_FEN a 64-bit digest of
+# History.get_position_key, which does not depend on the Zobrist tables.
+# The builder keeps at most max_entries positions in memory, spilling
+# sorted runs to disk and merging them at the end. Readers map the file
+# read-only, so processes querying the same index share the page cache.
+#
+# Usage:
+#   python chess_index.py build index.bin games.pgn [more.pgn ...]
+#   python chess_index.py query index.bin --fen "<fen>"
+
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import time
+
+from chess_engine import Game, START_FEN
+from chess_pgn import read_games, replay
+
+MAGIC = b"CHESSIDX"
+VERSION = 1
+KEY_ZOBRIST, KEY_FEN = 0, 1
+
+HEADER = struct.Struct("<8sHHQ")
+RECORD = struct.Struct("<QIIII")
+_KEY = struct.Struct("<Q")
+
+# Result string -> offset of its counter within (white, draws, black)
+_RESULT_SLOT = {"1-0": 0, "1/2-1/2": 1, "0-1": 2}
+
+
+def text_key(text):
+    """64-bit key for a position key string (see History.get_position_key)."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def position_key(game, scheme=KEY_ZOBRIST):
+    if scheme == KEY_ZOBRIST:
+        return game.board.zobrist ^ game.state.zobrist
+    return text_key(game.history.get_position_key(game.board, game.state))
+
+
+class PositionStats:
+    def __init__(self, count, white, draws, black):
+        self.count = count
+        self.white = white
+        self.draws = draws
+        self.black = black
+
+    @property
+    def score(self):
+        """White's score over decided and drawn games, 0.0 to 1.0."""
+        games = self.white + self.draws + self.black
+        return (self.white + self.draws / 2) / games if games else None
+
+    def __repr__(self):
+        return (f"PositionStats(count={self.count}, white={self.white}, "
+                f"draws={self.draws}, black={self.black})")
+
+
+def _read_records(path):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(RECORD.size * 4096)
+            if not block:
+                break
+            yield from RECORD.iter_unpack(block)
+
+
+class IndexBuilder:
+    """Collects positions and writes the sorted index file on close()."""
+
+    def __init__(self, path, scheme=KEY_ZOBRIST, max_entries=1_000_000):
+        self.path = path
+        self.scheme = scheme
+        self.max_entries = max_entries
+        # key -> [count, white, draws, black]
+        self.pending = {}
+        self.runs = []
+        self.games = 0
+        self.bad_games = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, key, result="*"):
+        stats = self.pending.get(key)
+        if stats is None:
+            stats = self.pending[key] = [0, 0, 0, 0]
+        stats[0] += 1
+        slot = _RESULT_SLOT.get(result)
+        if slot is not None:
+            stats[slot + 1] += 1
+        if len(self.pending) >= self.max_entries:
+            self._spill()
+
+    def add_game(self, pgn):
+        """Adds every position of a PgnGame, the start position included.
+        Games with an illegal move are skipped whole."""
+        try:
+            start = Game()
+            start.load_fen(pgn.headers.get("FEN") or START_FEN)
+            keys = [position_key(start, self.scheme)]
+            for _, game in replay(pgn):
+                keys.append(position_key(game, self.scheme))
+        except ValueError:
+            self.bad_games += 1
+            return False
+        self.games += 1
+        for key in keys:
+            self.add(key, pgn.result)
+        return True
+
+    def _spill(self):
+        run = f"{self.path}.run{len(self.runs)}"
+        with open(run, "wb") as f:
+            for key in sorted(self.pending):
+                f.write(RECORD.pack(key, *self.pending[key]))
+        self.runs.append(run)
+        self.pending = {}
+
+    def close(self):
+        """Merges everything added into the index file; returns the number
+        of distinct positions."""
+        if self.pending or not self.runs:
+            self._spill()
+        count = 0
+        with open(self.path, "wb") as out:
+            out.write(HEADER.pack(MAGIC, VERSION, self.scheme, 0))
+            merged = heapq.merge(*(_read_records(run) for run in self.runs))
+            current = None
+            for rec in merged:
+                if current is not None and rec[0] == current[0]:
+                    current = [current[0]] + [a + b for a, b in zip(current[1:], rec[1:])]
+                    continue
+                if current is not None:
+                    out.write(RECORD.pack(*current))
+                    count += 1
+                current = list(rec)
+            if current is not None:
+                out.write(RECORD.pack(*current))
+                count += 1
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, self.scheme, count))
+        for run in self.runs:
+            os.remove(run)
+        self.runs = []
+        return count
+
+
+class PositionIndex:
+    """Read-only view of an index file; lookups binary-search the mapping."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.scheme, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a position index")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def lookup_key(self, key):
+        """PositionStats for a key, or None if the position is not indexed."""
+        m = self._map
+        base = HEADER.size
+        size = RECORD.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = _KEY.unpack_from(m, base + mid * size)[0]
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return PositionStats(*RECORD.unpack_from(m, base + mid * size)[1:])
+        return None
+
+    def lookup(self, game):
+        """PositionStats for game's current position, or None."""
+        return self.lookup_key(position_key(game, self.scheme))
+
+
+def build(path, pgn_paths, scheme=KEY_ZOBRIST, max_entries=1_000_000):
+    """Builds an index from PGN files; returns a summary dict."""
+    t0 = time.perf_counter()
+    with IndexBuilder(path, scheme, max_entries) as builder:
+        for pgn_path in pgn_paths:
+            for pgn in read_games(pgn_path):
+                builder.add_game(pgn)
+        games, bad = builder.games, builder.bad_games
+    with PositionIndex(path) as index:
+        positions = len(index)
+    return {"games": games, "bad_games": bad, "positions": positions,
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Position statistics index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="index the positions of PGN files")
+    b.add_argument("index")
+    b.add_argument("pgn", nargs="+")
+    b.add_argument("--fen-keys", action="store_true",
+                   help="key by position string instead of Zobrist hash")
+    b.add_argument("--max-entries", type=int, default=1_000_000,
+                   help="positions held in memory before spilling to disk")
+    q = sub.add_parser("query", help="look up one position")
+    q.add_argument("index")
+    q.add_argument("--fen", default=START_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        scheme = KEY_FEN if args.fen_keys else KEY_ZOBRIST
+        print(build(args.index, args.pgn, scheme, args.max_entries))
+        return 0
+
+    game = Game()
+    game.load_fen(args.fen)
+    with PositionIndex(args.index) as index:
+        print(index.lookup(game))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# chess_loadgen.py
+# Load generator for chess_server: N concurrent sessions playing random
+# legal moves, reporting request latency percentiles and moves per second
+#
+# Usage:
+#   python chess_loadgen.py --port 8765 --sessions 200 --seconds 20
+#   python chess_loadgen.py --unix /tmp/chess.sock --sessions 50
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))
+    return sorted_values[i]
+
+
+async def _request(reader, writer, request, latencies):
+    t0 = time.perf_counter()
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    latencies.append(time.perf_counter() - t0)
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    return reply
+
+
+async def _client(index, connect, deadline, max_plies, seed, latencies, counts):
+    # One connection playing one game after another until the deadline
+    rng = random.Random(f"{seed}-{index}")
+    reader, writer = await connect()
+    try:
+        while time.perf_counter() < deadline:
+            reply = await _request(reader, writer, {"op": "new"}, latencies)
+            session = reply["session"]
+            plies = 0
+            while not reply["game_over"] and plies < max_plies and time.perf_counter() < deadline:
+                move = rng.choice(reply["legal"])
+                reply = await _request(reader, writer, {"op": "move", "session": session,
+                                                        "move": move}, latencies)
+                plies += 1
+                counts["moves"] += 1
+            await _request(reader, writer, {"op": "close", "session": session}, latencies)
+            counts["games"] += 1
+    finally:
+        writer.close()
+
+
+async def run(sessions, seconds, host="127.0.0.1", port=8765, unix=None,
+              max_plies=200, seed=0):
+    """Runs the load for the given time; returns a summary dict."""
+    if unix:
+        connect = lambda: asyncio.open_unix_connection(unix)
+    else:
+        connect = lambda: asyncio.open_connection(host, port)
+    latencies = []
+    counts = {"moves": 0, "games": 0}
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+    await asyncio.gather(*(_client(i, connect, deadline, max_plies, seed, latencies, counts)
+                           for i in range(sessions)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    ms = lambda p: round(percentile(latencies, p) * 1000, 2)
+    return {
+        "sessions": sessions,
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "moves": counts["moves"],
+        "games": counts["games"],
+        "moves_per_s": round(counts["moves"] / elapsed, 1),
+        "p50_ms": ms(50),
+        "p90_ms": ms(90),
+        "p99_ms": ms(99),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for chess_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--max-plies", type=int, default=200, help="plies before a new game")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    summary = asyncio.run(run(args.sessions, args.seconds, args.host, args.port,
+                              args.unix, args.max_plies, args.seed))
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# chess_perft.py
+# Perft suite for chess_engine: node counts, nodes per second and divide output
+#
+# Usage:
+#   python chess_perft.py                      # run the suite to depth 3
+#   python chess_perft.py --depth 4 --workers 4
+#   python chess_perft.py --fen "<fen>" --depth 3 --divide
+#   python chess_perft.py --backend bitboard
+
+import argparse
+import sys
+import time
+from multiprocessing import Pool
+
+from chess_engine import Board, Game, divide, perft
+from chess_bitboard import BitBoard
+import chess_profile
+
+BACKENDS = {"mailbox": Board, "bitboard": BitBoard}
+
+# Standard perft positions and their known node counts by depth
+POSITIONS = [
+    ("startpos",
+     "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete",  # castling, en passant, pins, promotions
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position3",  # en passant discovered checks along the rank
+     "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position4",  # promotions and castling rights under attack
+     "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position5",
+     "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position6",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def _load(fen, backend):
+    game = Game(BACKENDS[backend])
+    game.load_fen(fen)
+    return game
+
+
+def _root_move_nodes(args):
+    """Pool worker: perft below one root move, given as a UCI string."""
+    fen, uci, depth, backend = args
+    game = _load(fen, backend)
+    for m in game.get_legal_moves_for_current_player():
+        if m.uci() == uci:
+            game.board.make_move(m, game.state)
+            return uci, perft(game, depth - 1)
+    raise ValueError(f"{uci} is not legal in {fen}")
+
+
+def run_divide(fen, depth, backend="mailbox", workers=1):
+    """Perft split by root move, optionally across a process pool."""
+    if workers <= 1 or depth < 2:
+        return divide(_load(fen, backend), depth)
+    game = _load(fen, backend)
+    jobs = [(fen, m.uci(), depth, backend) for m in game.get_legal_moves_for_current_player()]
+    with Pool(workers) as pool:
+        return dict(chess_profile.pool_map(pool.imap_unordered, _root_move_nodes, jobs))
+
+
+def run_perft(fen, depth, backend="mailbox", workers=1):
+    """Returns (nodes, seconds)."""
+    t0 = time.perf_counter()
+    if workers > 1 and depth >= 2:
+        nodes = sum(run_divide(fen, depth, backend, workers).values())
+    else:
+        nodes = perft(_load(fen, backend), depth)
+    return nodes, time.perf_counter() - t0
+
+
+def run_suite(max_depth=3, backend="mailbox", workers=1, out=sys.stdout):
+    """Runs every standard position up to max_depth; returns True if all counts match."""
+    ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in POSITIONS:
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            nodes, secs = run_perft(fen, depth, backend, workers)
+            total_nodes += nodes
+            total_time += secs
+            good = nodes == expected[depth - 1]
+            ok = ok and good
+            nps = nodes / secs if secs else 0
+            print(f"{name:10s} depth {depth}  {nodes:>9d}  {secs:8.3f}s  {nps:>10,.0f} nps  "
+                  f"{'ok' if good else 'FAIL expected %d' % expected[depth - 1]}", file=out)
+    if total_time:
+        print(f"total {total_nodes} nodes in {total_time:.3f}s "
+              f"({total_nodes / total_time:,.0f} nps)", file=out)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft for chess_engine")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fen", help="run a single position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="print per-move counts")
+    parser.add_argument("--workers", type=int, default=1, help="split root moves across processes")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox")
+    args = parser.parse_args(argv)
+    if args.depth < 1:
+        parser.error("--depth must be at least 1")
+
+    if args.fen is None:
+        return 0 if run_suite(args.depth, args.backend, args.workers) else 1
+
+    t0 = time.perf_counter()
+    if args.divide:
+        counts = run_divide(args.fen, args.depth, args.backend, args.workers)
+        for uci in sorted(counts):
+            print(f"{uci}: {counts[uci]}")
+        nodes = sum(counts.values())
+    else:
+        nodes, _ = run_perft(args.fen, args.depth, args.backend, args.workers)
+    secs = time.perf_counter() - t0
+    print(f"\nnodes {nodes}  time {secs:.3f}s  nps {nodes / secs if secs else 0:,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
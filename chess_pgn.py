@@ -0,0 +1,391 @@
+# chess_pgn.py
+# Streaming PGN reader, replayer and writer for chess_engine
+#
+# Games are read and replayed one at a time, so memory use does not grow
+# with the size of the archive. With --workers the file is split into byte
+# ranges, each starting at a game's first tag line (a tag line that does
+# not follow another one), and each range is replayed in its own process.
+#
+# Usage:
+#   python chess_pgn.py games.pgn                    # validate every game
+#   python chess_pgn.py games.pgn --workers 4
+#   python chess_pgn.py games.pgn --fens positions.fen
+#   cat games.pgn | python chess_pgn.py -
+
+import argparse
+import os
+import re
+import sys
+import time
+from multiprocessing import Pool
+
+from chess_engine import (Board, Game, FILES, FEN_LETTERS, KIND_INDEX,
+                          PAWN, KING, START_FEN, square_name)
+import chess_profile
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SAN_PIECES = {"N": "Knight", "B": "Bishop", "R": "Rook", "Q": "Queen", "K": "King"}
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+_VARIATION = re.compile(r"\([^()]*\)")
+_NAG = re.compile(r"\$\d+")
+_MOVE_NUMBER = re.compile(r"^\d+\.+")
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+
+class PgnGame:
+    """One game as read from PGN: tag pairs, SAN moves and the result."""
+    __slots__ = ("headers", "moves", "result")
+
+    def __init__(self, headers, moves, result="*"):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    def describe(self):
+        h = self.headers
+        return (f"{h.get('White', '?')} - {h.get('Black', '?')}, "
+                f"{h.get('Event', '?')} {h.get('Date', '?')} round {h.get('Round', '?')}")
+
+
+# --- Reading ---
+
+def _movetext_tokens(text):
+    text = _COMMENT.sub(" ", text)
+    # Variations may nest, so strip the innermost ones until none are left
+    while "(" in text:
+        stripped = _VARIATION.sub(" ", text)
+        if stripped == text:
+            break
+        text = stripped
+    text = _NAG.sub(" ", text)
+    for token in text.split():
+        token = _MOVE_NUMBER.sub("", token)
+        if token:
+            yield token
+
+
+def _parse_game(tag_lines, move_lines):
+    headers = {}
+    for line in tag_lines:
+        m = _TAG.match(line)
+        if m:
+            headers[m.group(1)] = m.group(2).replace('\\"', '"').replace("\\\\", "\\")
+    moves = []
+    result = headers.get("Result", "*")
+    for token in _movetext_tokens("\n".join(move_lines)):
+        if token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return PgnGame(headers, moves, result)
+
+
+def parse_games(lines):
+    """Groups PGN text lines into PgnGame objects, one game at a time."""
+    tag_lines = []
+    move_lines = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("%"):
+            continue
+        if line.startswith("["):
+            # A tag after movetext starts the next game
+            if move_lines:
+                yield _parse_game(tag_lines, move_lines)
+                tag_lines = []
+                move_lines = []
+            tag_lines.append(line)
+        else:
+            move_lines.append(line)
+    if tag_lines or move_lines:
+        yield _parse_game(tag_lines, move_lines)
+
+
+def read_games(source):
+    """Yields the games in source: a path, "-" for stdin, or an open text file."""
+    if source == "-":
+        source = sys.stdin
+    if isinstance(source, str):
+        with open(source, encoding="utf-8", errors="replace") as f:
+            yield from parse_games(f)
+    else:
+        yield from parse_games(source)
+
+
+# --- SAN ---
+
+def parse_san(game, san):
+    """The legal move in game's current position that san names."""
+    text = san.rstrip("+#!?")
+    legal = game.get_legal_moves_for_current_player()
+    squares = game.board.squares
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        to_x = 6 if len(text) == 3 else 2
+        for m in legal:
+            if (squares[m.from_x][m.from_y].piece.kind == KING and m.from_x == 4
+                    and m.to_x == to_x):
+                return m
+        raise ValueError(f"illegal move {san}")
+
+    match = _SAN.match(text)
+    if not match:
+        raise ValueError(f"bad SAN move {san!r}")
+    piece, from_file, from_rank, to, promotion = match.groups()
+    kind = KIND_INDEX[SAN_PIECES[piece]] if piece else PAWN
+    to_x, to_y = FILES.index(to[0]), int(to[1]) - 1
+    from_x = FILES.index(from_file) if from_file else None
+    from_y = int(from_rank) - 1 if from_rank else None
+    promotion = SAN_PIECES[promotion] if promotion else None
+
+    found = None
+    for m in legal:
+        if (m.to_x != to_x or m.to_y != to_y or m.promotion != promotion
+                or squares[m.from_x][m.from_y].piece.kind != kind):
+            continue
+        if from_x is not None and m.from_x != from_x:
+            continue
+        if from_y is not None and m.from_y != from_y:
+            continue
+        if found is not None:
+            raise ValueError(f"ambiguous move {san}")
+        found = m
+    if found is None:
+        raise ValueError(f"illegal move {san}")
+    return found
+
+
+def move_to_san(game, move):
+    """SAN for a legal move in game's current position, with + or #."""
+    board, state = game.board, game.state
+    piece = board.squares[move.from_x][move.from_y].piece
+    target = square_name(move.to_x, move.to_y)
+
+    if piece.kind == KING and abs(move.to_x - move.from_x) == 2:
+        san = "O-O" if move.to_x == 6 else "O-O-O"
+    elif piece.kind == PAWN:
+        if move.to_x != move.from_x:
+            san = FILES[move.from_x] + "x" + target
+        else:
+            san = target
+        if move.promotion:
+            san += "=" + FEN_LETTERS[KIND_INDEX[move.promotion]].upper()
+    else:
+        # Name the origin file, rank or both if another piece of the same
+        # type could also move to the target
+        rivals = [m for m in game.get_legal_moves_for_current_player()
+                  if m.to_x == move.to_x and m.to_y == move.to_y
+                  and (m.from_x, m.from_y) != (move.from_x, move.from_y)
+                  and board.squares[m.from_x][m.from_y].piece is piece]
+        origin = ""
+        if rivals:
+            if all(m.from_x != move.from_x for m in rivals):
+                origin = FILES[move.from_x]
+            elif all(m.from_y != move.from_y for m in rivals):
+                origin = str(move.from_y + 1)
+            else:
+                origin = square_name(move.from_x, move.from_y)
+        capture = "x" if board.squares[move.to_x][move.to_y].piece else ""
+        san = FEN_LETTERS[piece.kind].upper() + origin + capture + target
+
+    board.make_move(move, state)
+    if game.val.is_in_check(board, state.turn, state):
+        san += "+" if game.legal_gen.has_any_legal_move(board, state.turn, state) else "#"
+    board.unmake_move(state)
+    return san
+
+
+# --- Replay ---
+
+def replay(pgn, board_class=Board):
+    """Plays pgn's moves through the rules engine, yielding (move, game)
+    after each one. The same Game object is yielded every time. Raises
+    ValueError at the first illegal or unreadable move."""
+    game = Game(board_class)
+    if pgn.headers.get("FEN"):
+        game.load_fen(pgn.headers["FEN"])
+    else:
+        game.start_game()
+    for ply, san in enumerate(pgn.moves):
+        try:
+            move = parse_san(game, san)
+        except ValueError as e:
+            raise ValueError(f"ply {ply + 1}: {e}") from None
+        game.apply_move(move)
+        yield move, game
+
+
+def validate(games, summary, fens=None, max_errors=20):
+    """Replays games, adding counts and the first max_errors errors to
+    summary; writes the FEN after every move to the file fens if given."""
+    for pgn in games:
+        summary["games"] += 1
+        try:
+            for _, game in replay(pgn):
+                summary["plies"] += 1
+                if fens is not None:
+                    fens.write(game.fen() + "\n")
+        except ValueError as e:
+            summary["bad"] += 1
+            if len(summary["errors"]) < max_errors:
+                summary["errors"].append(f"{pgn.describe()}: {e}")
+    return summary
+
+
+def _new_summary():
+    return {"games": 0, "plies": 0, "bad": 0, "errors": []}
+
+
+def _is_tag(line):
+    return line.lstrip().startswith(b"[")
+
+
+def _after_tag(f, pos):
+    """Whether the last non-blank line before byte pos (a line start) is a
+    tag line; reads backwards from pos in blocks."""
+    data = b""
+    end = pos
+    while end > 0:
+        begin = max(0, end - 4096)
+        f.seek(begin)
+        data = f.read(end - begin) + data
+        lines = data.split(b"\n")
+        # The first piece may be the tail of a longer line unless at offset 0
+        for line in reversed(lines if begin == 0 else lines[1:]):
+            if line.strip() and not line.lstrip().startswith(b"%"):
+                return _is_tag(line)
+        end = begin
+    return False
+
+
+def _range_lines(path, start, end):
+    """Lines of the games that start in [start, end). A game starts at a
+    tag line that does not follow another tag line, as in parse_games."""
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        in_tags = _after_tag(f, pos)
+        f.seek(pos)
+        started = False
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if _is_tag(line):
+                if not in_tags:
+                    if pos >= end:
+                        break
+                    started = True
+                in_tags = True
+            elif line.strip() and not line.lstrip().startswith(b"%"):
+                in_tags = False
+            if started:
+                yield line.decode("utf-8", "replace")
+
+
+def _validate_range(args):
+    path, start, end = args
+    return validate(parse_games(_range_lines(path, start, end)), _new_summary())
+
+
+def validate_file(source, workers=1, fens=None):
+    """Replays every game in source and returns a summary dict. With
+    workers > 1 (source must be a path) the file is split across processes."""
+    t0 = time.perf_counter()
+    summary = None
+    if workers > 1 and isinstance(source, str) and source != "-":
+        size = os.path.getsize(source)
+        chunks = workers * 4
+        bounds = [size * i // chunks for i in range(chunks + 1)]
+        jobs = [(source, bounds[i], bounds[i + 1]) for i in range(chunks)]
+        summary = _new_summary()
+        with Pool(workers) as pool:
+            for part in chess_profile.pool_map(pool.imap_unordered, _validate_range, jobs):
+                for key in ("games", "plies", "bad"):
+                    summary[key] += part[key]
+                summary["errors"].extend(part["errors"])
+        if not summary["games"] and size:
+            # Nothing looked like the start of a game; read it serially
+            summary = None
+    if summary is None:
+        summary = validate(read_games(source), _new_summary(), fens)
+    summary["seconds"] = round(time.perf_counter() - t0, 3)
+    return summary
+
+
+# --- Writing ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_pgn(game, headers=None, width=80):
+    """PGN text for game's move history, replayed from game.start_fen."""
+    tags = {"Event": "?", "Site": "?", "Date": "????.??.??", "Round": "?",
+            "White": "?", "Black": "?", "Result": game.result()}
+    start = game.start_fen or START_FEN
+    if start != START_FEN:
+        tags["SetUp"] = "1"
+        tags["FEN"] = start
+    if headers:
+        tags.update(headers)
+
+    replay_game = Game(game.board_class)
+    replay_game.load_fen(start)
+    state = replay_game.state
+    # Move numbers stay on the same line as the move they number
+    tokens = []
+    for move in game.history.iter_moves():
+        legal = replay_game.get_legal_moves_for_current_player()
+        move = legal[legal.index(move)]
+        san = move_to_san(replay_game, move)
+        if state.turn == "White":
+            san = f"{state.fullmove_number}. {san}"
+        elif not tokens:
+            san = f"{state.fullmove_number}... {san}"
+        tokens.append(san)
+        replay_game.apply_move(move)
+    tokens.append(tags["Result"])
+
+    lines = []
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+
+    tag_lines = [f'[{name} "{_escape(value)}"]' for name, value in tags.items()]
+    return "\n".join(tag_lines) + "\n\n" + "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay and validate PGN files")
+    parser.add_argument("path", help='PGN file, or "-" for stdin')
+    parser.add_argument("--workers", type=int, default=1,
+                        help="split the file across processes")
+    parser.add_argument("--fens", help="write the FEN after every move to this file")
+    args = parser.parse_args(argv)
+    if args.fens and args.workers > 1:
+        parser.error("--fens needs a single worker")
+
+    if args.fens:
+        with open(args.fens, "w") as fens:
+            summary = validate_file(args.path, fens=fens)
+    else:
+        summary = validate_file(args.path, args.workers)
+    for error in summary.pop("errors"):
+        print(error, file=sys.stderr)
+    print(summary)
+    return 1 if summary["bad"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
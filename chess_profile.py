@@ -0,0 +1,216 @@
+# chess_profile.py
+# Optional instrumentation for the engine's hot functions: call counts,
+# cumulative time, and counts of boards cloned and moves created
+#
+# Nothing is instrumented until enable() is called: it swaps timing
+# wrappers in for the class attributes listed in TARGETS, and disable()
+# puts the original functions back, so a disabled profiler costs nothing.
+# Times are inclusive (a function's time includes the functions it calls)
+# and counts are not locked, so concurrent threads may lose the odd count.
+# Work sent to a process pool through pool_map() is profiled in the worker
+# and added to the parent's figures, so with several workers the seconds
+# are summed over processes and can exceed the wall time.
+#
+# Usage:
+#   CHESS_PROFILE=1 python chess_selfplay.py ...       # report on stderr at exit
+#   CHESS_PROFILE=prof.json python chess_uci.py        # JSON report at exit
+#
+#   chess_profile.enable(); ...; print(chess_profile.report())
+#   snap = chess_profile.snapshot(); chess_profile.reset()
+#   for r in chess_profile.pool_map(pool.imap_unordered, fn, jobs): ...
+#   python chess_pygame.py                             # F3 toggles the overlay
+
+import atexit
+import json
+import os
+import sys
+import time
+
+import chess_bitboard
+import chess_engine
+
+# (class, attribute, label) of every timed function
+TARGETS = [
+    (chess_engine.Piece, "get_moves", "Piece.get_moves"),
+    (chess_engine.Board, "generate_moves", "Board.generate_moves"),
+    (chess_bitboard.BitBoard, "generate_moves", "BitBoard.generate_moves"),
+    (chess_engine.MoveGenerator, "generate_moves", "MoveGenerator.generate_moves"),
+    (chess_engine.LegalMoveGenerator, "generate_legal_moves",
+     "LegalMoveGenerator.generate_legal_moves"),
+    (chess_engine.MoveValidator, "is_in_check", "MoveValidator.is_in_check"),
+    (chess_engine.MoveValidator, "is_legal", "MoveValidator.is_legal"),
+    (chess_engine.Board, "clone", "Board.clone"),
+    (chess_engine.Game, "_check_end", "Game._check_end"),
+]
+
+# (class, attribute, counter) of the constructors counted as allocations
+ALLOCATIONS = [
+    (chess_engine.Board, "clone", "boards_cloned"),
+    (chess_engine.Move, "__init__", "moves_created"),
+]
+
+# label -> [calls, seconds]
+_stats = {label: [0, 0.0] for _, _, label in TARGETS}
+_counts = {name: 0 for _, _, name in ALLOCATIONS}
+# (class, attribute, original) for everything patched by enable()
+_saved = []
+_started = time.perf_counter()
+
+
+def _timed(fn, entry):
+    perf_counter = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        entry[0] += 1
+        t0 = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            entry[1] += perf_counter() - t0
+    wrapper.__wrapped__ = fn
+    return wrapper
+
+
+def _counted(fn, name):
+    def wrapper(*args, **kwargs):
+        _counts[name] += 1
+        return fn(*args, **kwargs)
+    wrapper.__wrapped__ = fn
+    return wrapper
+
+
+def _patch(cls, attr, make):
+    # Only functions defined on cls itself; inherited ones are patched on
+    # the class that defines them
+    fn = cls.__dict__.get(attr)
+    if fn is None:
+        return
+    _saved.append((cls, attr, fn))
+    setattr(cls, attr, make(fn))
+
+
+def enabled():
+    return bool(_saved)
+
+
+def enable():
+    """Installs the instrumentation; counting continues from the last reset."""
+    if _saved:
+        return
+    for cls, attr, name in ALLOCATIONS:
+        _patch(cls, attr, lambda fn, name=name: _counted(fn, name))
+    for cls, attr, label in TARGETS:
+        _patch(cls, attr, lambda fn, entry=_stats[label]: _timed(fn, entry))
+
+
+def disable():
+    """Restores the original functions; the figures so far are kept."""
+    while _saved:
+        cls, attr, fn = _saved.pop()
+        setattr(cls, attr, fn)
+
+
+def reset():
+    global _started
+    for entry in _stats.values():
+        entry[0] = 0
+        entry[1] = 0.0
+    for name in _counts:
+        _counts[name] = 0
+    _started = time.perf_counter()
+
+
+def snapshot():
+    """The figures since the last reset as a JSON-ready dict."""
+    functions = {}
+    for label, (calls, seconds) in _stats.items():
+        if calls:
+            functions[label] = {"calls": calls, "seconds": round(seconds, 6),
+                                "mean_us": round(seconds / calls * 1e6, 2)}
+    return {
+        "enabled": enabled(),
+        "wall_seconds": round(time.perf_counter() - _started, 3),
+        "functions": functions,
+        "allocations": dict(_counts),
+    }
+
+
+def merge(snap):
+    """Adds the function and allocation figures of a snapshot taken in
+    another process to this one's."""
+    for label, f in snap["functions"].items():
+        entry = _stats.get(label)
+        if entry is not None:
+            entry[0] += f["calls"]
+            entry[1] += f["seconds"]
+    for name, count in snap["allocations"].items():
+        if name in _counts:
+            _counts[name] += count
+
+
+def _profiled_call(job):
+    # Pool worker: runs one job with the instrumentation on and returns the
+    # result with that job's figures. It is taken off again afterwards, as
+    # a persistent pool outlives the parent's profiling.
+    fn, arg = job
+    enable()
+    reset()
+    try:
+        return fn(arg), snapshot()
+    finally:
+        disable()
+
+
+def pool_map(method, fn, jobs):
+    """Yields method(fn, jobs) for a Pool method such as map or
+    imap_unordered; while profiling, the workers' figures are merged in."""
+    if not enabled():
+        yield from method(fn, jobs)
+        return
+    for result, snap in method(_profiled_call, [(fn, job) for job in jobs]):
+        merge(snap)
+        yield result
+
+
+def report_lines(snap=None):
+    """Short text lines for a snapshot, busiest functions first."""
+    snap = snap or snapshot()
+    rows = sorted(snap["functions"].items(), key=lambda kv: -kv[1]["seconds"])
+    lines = [f"{label.split('.')[-1]:22s} {f['calls']:9d} {f['seconds']:8.3f}s {f['mean_us']:9.1f}us"
+             for label, f in rows]
+    lines.append("  ".join(f"{name} {count}" for name, count in snap["allocations"].items()))
+    return lines
+
+
+def report(snap=None):
+    """Full text report: every function label with its figures."""
+    snap = snap or snapshot()
+    rows = sorted(snap["functions"].items(), key=lambda kv: -kv[1]["seconds"])
+    lines = [f"{'function':42s} {'calls':>10s} {'seconds':>10s} {'mean us':>10s}"]
+    for label, f in rows:
+        lines.append(f"{label:42s} {f['calls']:10d} {f['seconds']:10.3f} {f['mean_us']:10.1f}")
+    for name, count in snap["allocations"].items():
+        lines.append(f"{name:42s} {count:10d}")
+    lines.append(f"wall time {snap['wall_seconds']:.3f}s")
+    return "\n".join(lines)
+
+
+def dump_json(path):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def _report_at_exit(target):
+    if target == "1":
+        print(report(), file=sys.stderr)
+    else:
+        dump_json(target)
+
+
+def enable_from_env():
+    """Turns profiling on if CHESS_PROFILE is set: "1" prints the report on
+    stderr at exit, anything else is a path for the JSON report."""
+    target = os.environ.get("CHESS_PROFILE")
+    if target and not enabled():
+        enable()
+        atexit.register(_report_at_exit, target)
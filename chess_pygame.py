@@ -1,9 +1,20 @@
 # chess_pygame.py
 # Pygame GUI for the chess_engine
-
+#
+# Usage:
+#   python chess_pygame.py                          # two players
+#   python chess_pygame.py --engine black --movetime 2
+#
+#   F3 toggles a chess_profile overlay, profiling while it is shown
+
+import argparse
+import queue
 import sys
+import threading
 import pygame
+import chess_profile
 from chess_engine import Game, Move
+from chess_search import Searcher
 
 # --- Settings ---
 TILE_SIZE = 80
@@ -16,6 +27,13 @@ MOVE_DOT_COLOR = (50, 50, 50)
 SELECT_COLOR = (246, 246, 105)
 BG_COLOR = (30, 30, 30)
 
+# Posted by EngineWorker with the game after a move; THINK_TICK animates
+# the status line while the engine thinks
+ENGINE_DONE = pygame.event.custom_type()
+THINK_TICK = pygame.event.custom_type()
+# Refreshes the profiler overlay while it is shown
+PROFILE_TICK = pygame.event.custom_type()
+
 
 def load_piece_images():
     """Load all PNG chess piece images into a dictionary."""
@@ -67,128 +85,298 @@ def screen_to_board(px, py):
     return int(file_x), int(rank_y)
 
 
-def draw_board(screen, game, selected, legal_moves_from_selected, piece_images, status_text, small_font):
-    # Background
-    screen.fill(BG_COLOR)
-
-    # Draw 8x8 board
-    for x in range(8):
-        for y in range(8):
-            sx, sy = board_to_screen(x, y)
-            is_light = (x + y) % 2 == 0
-            color = LIGHT_COLOR if is_light else DARK_COLOR
-            rect = pygame.Rect(sx, sy, TILE_SIZE, TILE_SIZE)
-            pygame.draw.rect(screen, color, rect)
-
-    # Highlight selected square
-    if selected is not None:
-        sx, sy = board_to_screen(*selected)
-        pygame.draw.rect(screen, SELECT_COLOR, (sx, sy, TILE_SIZE, TILE_SIZE), 4)
-
-    # Highlight legal target squares (dots)
-    for mv in legal_moves_from_selected:
-        tx, ty = mv.to_x, mv.to_y
-        sx, sy = board_to_screen(tx, ty)
-        center = (sx + TILE_SIZE // 2, sy + TILE_SIZE // 2)
-        pygame.draw.circle(screen, MOVE_DOT_COLOR, center, TILE_SIZE // 8)
-
-    # Draw pieces
-    for x in range(8):
-        for y in range(8):
-            sq = game.board.squares[x][y]
-            p = sq.piece
-            if not p:
+class EngineWorker:
+    """Background thread that plays moves on a copy of the game, including
+    the engine's own search and end-of-game detection, and posts each
+    result to the event loop as an ENGINE_DONE event."""
+
+    def __init__(self, movetime=1.0):
+        self.searcher = Searcher(tt_bits=16)
+        self.movetime = movetime
+        self.jobs = queue.Queue()
+        # Bumped by cancel(); results of older jobs are dropped
+        self.generation = 0
+        # Set to stop the latest job's search; each job gets its own, so a
+        # stop sent before the search starts is not lost
+        self.stop_event = threading.Event()
+        self.busy = False
+        self.thinking = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def play(self, game, move):
+        """Applies a player's move."""
+        self._submit(game, move)
+
+    def think(self, game):
+        """Searches for the engine's move and applies it."""
+        self.thinking = True
+        self._submit(game, None)
+
+    def _submit(self, game, move):
+        self.busy = True
+        self.stop_event = threading.Event()
+        self.jobs.put((self.generation, game, move, self.stop_event))
+
+    def move_now(self):
+        """Ends the search early; the best move found so far is played."""
+        self.stop_event.set()
+
+    def cancel(self):
+        """Drops queued and running jobs; their results are never posted."""
+        self.generation += 1
+        self.stop_event.set()
+        self.busy = False
+        self.thinking = False
+        pygame.time.set_timer(THINK_TICK, 0)
+
+    def accept(self, event):
+        """The game carried by an ENGINE_DONE event, or None if stale."""
+        if event.generation != self.generation:
+            return None
+        self.busy = False
+        self.thinking = False
+        return event.game
+
+    def _run(self):
+        while True:
+            generation, game, move, stop_event = self.jobs.get()
+            if generation != self.generation:
                 continue
-            img = piece_images.get((p.color, p.name))
+            if move is None:
+                move = self.searcher.search(game, movetime=self.movetime,
+                                            stop_event=stop_event).move
+            game = game.copy()
+            game.make_move(move)
+            pygame.event.post(pygame.event.Event(ENGINE_DONE, generation=generation, game=game))
+
+
+class Renderer:
+    """Draws the GUI from pre-rendered surfaces, redrawing only the squares
+    and text that changed since the last frame."""
+
+    def __init__(self, screen, piece_images, big_font, small_font):
+        self.screen = screen
+        self.piece_images = piece_images
+        self.big_font = big_font
+        self.small_font = small_font
+        self.full_rect = screen.get_rect()
+        self.status_rect = pygame.Rect(0, BOARD_SIZE, BOARD_SIZE, self.full_rect.height - BOARD_SIZE)
+
+        # Window fill plus the 64 tiles, rendered once
+        self.background = pygame.Surface(self.full_rect.size)
+        self.background.fill(BG_COLOR)
+        for x in range(8):
+            for y in range(8):
+                color = LIGHT_COLOR if (x + y) % 2 == 0 else DARK_COLOR
+                pygame.draw.rect(self.background, color, (*board_to_screen(x, y), TILE_SIZE, TILE_SIZE))
+
+        self.game_over_dim = pygame.Surface(self.full_rect.size, pygame.SRCALPHA)
+        self.game_over_dim.fill((0, 0, 0, 180))
+        self.promotion_dim = pygame.Surface((BOARD_SIZE, BOARD_SIZE), pygame.SRCALPHA)
+        self.promotion_dim.fill((0, 0, 0, 160))
+        self._text = {}
+        self.overlay_font = pygame.font.SysFont("DejaVu Sans Mono", 13)
+
+        # What is on screen: the scene ("menu", "board", "promotion",
+        # "game_over" or None after invalidate), and per square the
+        # (piece, selected, dot) it was last drawn with
+        self.scene = None
+        self.shown = [None] * 64
+        self.status = None
+        # Debug overlay lines drawn over everything, or None
+        self.overlay = None
+
+        # Clickable areas of the current scene
+        self.start_button = None
+        self.play_again_button = None
+        self.menu_button = None
+        self.promotion_rects = []
+
+    def invalidate(self):
+        """Forget what is on screen, so the next render redraws everything."""
+        self.scene = None
+
+    def text(self, font, text, color):
+        key = (id(font), text, color)
+        surf = self._text.get(key)
+        if surf is None:
+            surf = self._text[key] = font.render(text, True, color)
+        return surf
+
+    def render(self, ui_state, game, selected, legal_moves_from_selected, status_text,
+               promotion_moves=(), promotion_color=None, overlay=None):
+        """Brings the screen up to date; returns the rectangles to update."""
+        args = (ui_state, game, selected, legal_moves_from_selected, status_text,
+                promotion_moves, promotion_color)
+        if overlay != self.overlay:
+            self.overlay = overlay
+            self.invalidate()
+        rects = self._render_scene(*args)
+        if self.overlay and rects:
+            # Squares under the translucent overlay cannot be patched one by
+            # one, so any change redraws the whole window while it is shown
+            if rects != [self.full_rect]:
+                self.invalidate()
+                rects = self._render_scene(*args)
+            self.draw_overlay(self.overlay)
+        return rects
+
+    def _render_scene(self, ui_state, game, selected, legal_moves_from_selected, status_text,
+                      promotion_moves, promotion_color):
+        if ui_state == "menu":
+            if self.scene == "menu":
+                return []
+            self.draw_main_menu()
+            self.scene = "menu"
+            return [self.full_rect]
+
+        if ui_state in ("promotion", "game_over"):
+            # Overlays do not change while shown
+            if self.scene == ui_state:
+                return []
+            self.draw_board(game, selected, legal_moves_from_selected, status_text)
+            if ui_state == "promotion":
+                self.draw_promotion_overlay(promotion_moves, promotion_color)
+            else:
+                self.draw_game_over_overlay(game)
+            self.scene = ui_state
+            return [self.full_rect]
+
+        return self.draw_board(game, selected, legal_moves_from_selected, status_text)
+
+    def draw_board(self, game, selected, legal_moves_from_selected, status_text):
+        screen = self.screen
+        full = self.scene != "board"
+        if full:
+            screen.blit(self.background, (0, 0))
+            self.shown = [None] * 64
+            self.status = None
+            self.scene = "board"
+
+        dots = {(mv.to_x, mv.to_y) for mv in legal_moves_from_selected}
+        rects = []
+        squares = game.board.squares
+        for x in range(8):
+            for y in range(8):
+                view = (squares[x][y].piece, (x, y) == selected, (x, y) in dots)
+                if self.shown[y * 8 + x] == view:
+                    continue
+                self.shown[y * 8 + x] = view
+                p, is_selected, has_dot = view
+                rect = pygame.Rect(*board_to_screen(x, y), TILE_SIZE, TILE_SIZE)
+                screen.blit(self.background, rect, rect)
+                if is_selected:
+                    pygame.draw.rect(screen, SELECT_COLOR, rect, 4)
+                if has_dot:
+                    pygame.draw.circle(screen, MOVE_DOT_COLOR, rect.center, TILE_SIZE // 8)
+                if p:
+                    img = self.piece_images.get((p.color, p.name))
+                    if img:
+                        screen.blit(img, rect)
+                rects.append(rect)
+
+        # Status line (turn / result)
+        if status_text != self.status:
+            self.status = status_text
+            screen.blit(self.background, self.status_rect, self.status_rect)
+            screen.blit(self.text(self.small_font, status_text, (220, 220, 220)), (5, BOARD_SIZE + 5))
+            rects.append(self.status_rect)
+
+        return [self.full_rect] if full else rects
+
+    def draw_overlay(self, lines):
+        height = 16 * len(lines) + 8
+        panel = pygame.Surface((BOARD_SIZE, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 190))
+        self.screen.blit(panel, (0, 0))
+        for i, line in enumerate(lines):
+            # Not cached: the figures change on every refresh
+            self.screen.blit(self.overlay_font.render(line, True, (120, 255, 120)), (6, 4 + 16 * i))
+
+    def draw_main_menu(self):
+        screen = self.screen
+        screen.fill(BG_COLOR)
+
+        title = self.text(self.big_font, "Chess Game", (255, 255, 255))
+        subtitle = self.text(self.small_font, "Click 'Start Game' to play", (220, 220, 220))
+
+        screen.blit(title, title.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 80)))
+        screen.blit(subtitle, subtitle.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 40)))
+
+        button_rect = pygame.Rect(0, 0, 220, 60)
+        button_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2 + 20)
+        pygame.draw.rect(screen, (100, 200, 100), button_rect, border_radius=10)
+
+        btn_text = self.text(self.big_font, "Start Game", (0, 0, 0))
+        screen.blit(btn_text, btn_text.get_rect(center=button_rect.center))
+
+        self.start_button = button_rect
+
+    def draw_game_over_overlay(self, game):
+        screen = self.screen
+        # Dim the screen
+        screen.blit(self.game_over_dim, (0, 0))
+
+        title = self.text(self.big_font, "Game Over", (255, 255, 255))
+        reason = game.game_over_reason or "Result"
+
+        reason_surf = self.text(self.small_font, reason, (230, 230, 230))
+
+        screen.blit(title, title.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 80)))
+        screen.blit(reason_surf, reason_surf.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 40)))
+
+        # Buttons
+        play_rect = pygame.Rect(0, 0, 200, 50)
+        menu_rect = pygame.Rect(0, 0, 200, 50)
+        play_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2 + 10)
+        menu_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2 + 70)
+
+        pygame.draw.rect(screen, (100, 200, 100), play_rect, border_radius=10)
+        pygame.draw.rect(screen, (200, 120, 120), menu_rect, border_radius=10)
+
+        play_text = self.text(self.small_font, "Play Again", (0, 0, 0))
+        menu_text = self.text(self.small_font, "Main Menu", (0, 0, 0))
+        screen.blit(play_text, play_text.get_rect(center=play_rect.center))
+        screen.blit(menu_text, menu_text.get_rect(center=menu_rect.center))
+
+        self.play_again_button = play_rect
+        self.menu_button = menu_rect
+
+    def draw_promotion_overlay(self, promotion_moves, color):
+        screen = self.screen
+        # Dim the board
+        screen.blit(self.promotion_dim, (0, 0))
+
+        # Panel
+        panel_width = 4 * TILE_SIZE + 40
+        panel_height = TILE_SIZE + 40
+        panel_rect = pygame.Rect(0, 0, panel_width, panel_height)
+        panel_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2)
+        pygame.draw.rect(screen, (230, 230, 230), panel_rect, border_radius=10)
+
+        # Options
+        start_x = panel_rect.left + 20
+        y = panel_rect.top + 20
+        self.promotion_rects = []
+
+        for i, move in enumerate(promotion_moves):
+            piece_name = move.promotion
+            img = self.piece_images.get((color, piece_name))
+            r = pygame.Rect(start_x + i * TILE_SIZE, y, TILE_SIZE, TILE_SIZE)
+            self.promotion_rects.append(r)
+            pygame.draw.rect(screen, (200, 200, 200), r, border_radius=5)
             if img:
-                sx, sy = board_to_screen(x, y)
-                screen.blit(img, (sx, sy))
-
-    # Status line (turn / result)
-    status_y = BOARD_SIZE + 5
-    text = small_font.render(status_text, True, (220, 220, 220))
-    screen.blit(text, (5, status_y))
-
-
-def draw_main_menu(screen, big_font, small_font):
-    screen.fill(BG_COLOR)
-
-    title = big_font.render("Chess Game", True, (255, 255, 255))
-    subtitle = small_font.render("Click 'Start Game' to play", True, (220, 220, 220))
-
-    screen.blit(title, title.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 80)))
-    screen.blit(subtitle, subtitle.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 40)))
-
-    button_rect = pygame.Rect(0, 0, 220, 60)
-    button_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2 + 20)
-    pygame.draw.rect(screen, (100, 200, 100), button_rect, border_radius=10)
-
-    btn_text = big_font.render("Start Game", True, (0, 0, 0))
-    screen.blit(btn_text, btn_text.get_rect(center=button_rect.center))
-
-    return button_rect
-
-
-def draw_game_over_overlay(screen, game, big_font, small_font):
-    # Dim the screen
-    overlay = pygame.Surface((BOARD_SIZE, BOARD_SIZE + 40), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 180))
-    screen.blit(overlay, (0, 0))
-
-    title = big_font.render("Game Over", True, (255, 255, 255))
-    reason = game.game_over_reason or "Result"
-
-    reason_surf = small_font.render(reason, True, (230, 230, 230))
-
-    screen.blit(title, title.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 80)))
-    screen.blit(reason_surf, reason_surf.get_rect(center=(BOARD_SIZE // 2, BOARD_SIZE // 2 - 40)))
-
-    # Buttons
-    play_rect = pygame.Rect(0, 0, 200, 50)
-    menu_rect = pygame.Rect(0, 0, 200, 50)
-    play_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2 + 10)
-    menu_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2 + 70)
-
-    pygame.draw.rect(screen, (100, 200, 100), play_rect, border_radius=10)
-    pygame.draw.rect(screen, (200, 120, 120), menu_rect, border_radius=10)
-
-    play_text = small_font.render("Play Again", True, (0, 0, 0))
-    menu_text = small_font.render("Main Menu", True, (0, 0, 0))
-    screen.blit(play_text, play_text.get_rect(center=play_rect.center))
-    screen.blit(menu_text, menu_text.get_rect(center=menu_rect.center))
-
-    return play_rect, menu_rect
+                screen.blit(img, (r.x, r.y))
 
 
-def draw_promotion_overlay(screen, promotion_moves, promotion_rects, piece_images, color):
-    # Dim the board
-    overlay = pygame.Surface((BOARD_SIZE, BOARD_SIZE), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 160))
-    screen.blit(overlay, (0, 0))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chess GUI")
+    parser.add_argument("--engine", choices=["white", "black", "none"], default="none",
+                        help="side played by the computer")
+    parser.add_argument("--movetime", type=float, default=1.0, help="engine seconds per move")
+    args = parser.parse_args(argv)
+    engine_color = None if args.engine == "none" else args.engine.capitalize()
 
-    # Panel
-    panel_width = 4 * TILE_SIZE + 40
-    panel_height = TILE_SIZE + 40
-    panel_rect = pygame.Rect(0, 0, panel_width, panel_height)
-    panel_rect.center = (BOARD_SIZE // 2, BOARD_SIZE // 2)
-    pygame.draw.rect(screen, (230, 230, 230), panel_rect, border_radius=10)
-
-    # Options
-    start_x = panel_rect.left + 20
-    y = panel_rect.top + 20
-    promotion_rects.clear()
-
-    for i, move in enumerate(promotion_moves):
-        piece_name = move.promotion
-        img = piece_images.get((color, piece_name))
-        r = pygame.Rect(start_x + i * TILE_SIZE, y, TILE_SIZE, TILE_SIZE)
-        promotion_rects.append(r)
-        pygame.draw.rect(screen, (200, 200, 200), r, border_radius=5)
-        if img:
-            screen.blit(img, (r.x, r.y))
-
-
-def main():
     pygame.init()
     pygame.display.set_caption("Chess - Pygame")
 
@@ -201,6 +389,7 @@ def main():
 
     big_font = pygame.font.SysFont("DejaVu Sans", 40, bold=True)
     small_font = pygame.font.SysFont("DejaVu Sans", 20)
+    renderer = Renderer(screen, piece_images, big_font, small_font)
 
     # UI states: "menu", "playing", "promotion", "game_over"
     ui_state = "menu"
@@ -209,55 +398,51 @@ def main():
     selected_square = None
     legal_moves_from_selected = []
 
-    # Main menu button rect
-    start_button_rect = None
-
     # Promotion state
     promotion_moves = []
-    promotion_rects = []
     promotion_color = None
 
-    # Game over buttons
-    play_again_rect = None
-    menu_rect = None
+    # Moves are applied, and engine moves searched, off the event loop
+    worker = EngineWorker(args.movetime)
+    think_dots = 0
+    show_profile = False
+
+    def new_game():
+        worker.cancel()
+        g = Game()
+        g.start_game()
+        if engine_color == g.state.turn:
+            worker.think(g)
+            pygame.time.set_timer(THINK_TICK, 400)
+        return g
 
     running = True
     while running:
-        clock.tick(FPS)
-
         # ---- DRAW FIRST (so we have button rects) ----
-        if ui_state == "menu":
-            start_button_rect = draw_main_menu(screen, big_font, small_font)
-
-        else:
-            if game and game.game_over and ui_state in ("playing", "promotion"):
-                ui_state = "game_over"
-
-            if game:
-                if not game.game_over:
-                    status_text = f"Turn: {game.state.turn}"
-                else:
-                    status_text = game.game_over_reason
-                draw_board(
-                    screen,
-                    game,
-                    selected_square,
-                    legal_moves_from_selected,
-                    piece_images,
-                    status_text,
-                    small_font,
-                )
-
-                if ui_state == "promotion":
-                    draw_promotion_overlay(screen, promotion_moves, promotion_rects, piece_images, promotion_color)
-
-                if ui_state == "game_over":
-                    play_again_rect, menu_rect = draw_game_over_overlay(screen, game, big_font, small_font)
-
-        pygame.display.flip()
+        if game and game.game_over and ui_state in ("playing", "promotion"):
+            ui_state = "game_over"
+
+        status_text = ""
+        if game:
+            if game.game_over:
+                status_text = game.game_over_reason
+            elif worker.thinking:
+                status_text = f"{game.state.turn} is thinking{'.' * (think_dots % 4)}  (Space: move now)"
+            else:
+                status_text = f"Turn: {game.state.turn}"
+        overlay = chess_profile.report_lines() if show_profile else None
+        rects = renderer.render(ui_state, game, selected_square, legal_moves_from_selected,
+                                status_text, promotion_moves, promotion_color, overlay)
+        if rects:
+            pygame.display.update(rects)
+            clock.tick(FPS)
 
         # ---- HANDLE EVENTS AFTER DRAW ----
-        for event in pygame.event.get():
+        # Sleep until something happens; an idle game uses no CPU
+        for event in [pygame.event.wait()] + pygame.event.get():
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.invalidate()
+
             if event.type == pygame.QUIT:
                 running = False
                 break
@@ -266,18 +451,44 @@ def main():
                 running = False
                 break
 
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE and worker.thinking:
+                worker.move_now()
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_profile = not show_profile
+                if show_profile:
+                    chess_profile.enable()
+                else:
+                    chess_profile.disable()
+                pygame.time.set_timer(PROFILE_TICK, 500 if show_profile else 0)
+
+            if event.type == THINK_TICK:
+                think_dots += 1
+
+            if event.type == ENGINE_DONE:
+                result = worker.accept(event)
+                if result is not None and ui_state == "playing":
+                    game = result
+                    pygame.time.set_timer(THINK_TICK, 0)
+                    if not game.game_over and game.state.turn == engine_color:
+                        worker.think(game)
+                        think_dots = 0
+                        pygame.time.set_timer(THINK_TICK, 400)
+                continue
+
             # MENU state
             if ui_state == "menu":
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    if start_button_rect and start_button_rect.collidepoint(event.pos):
-                        game = Game()
-                        game.start_game()
+                    if renderer.start_button and renderer.start_button.collidepoint(event.pos):
+                        game = new_game()
                         ui_state = "playing"
                         selected_square = None
                         legal_moves_from_selected = []
 
             # PLAYING state
             elif ui_state == "playing":
+                if worker.busy:
+                    continue
                 if game and not game.game_over and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     pos = event.pos
                     coords = screen_to_board(*pos)
@@ -291,10 +502,7 @@ def main():
                         # Select piece
                         if sq.piece and sq.piece.color == current_color:
                             selected_square = (bx, by)
-                            all_legal = game.get_legal_moves_for_current_player()
-                            legal_moves_from_selected = [
-                                m for m in all_legal if m.from_x == bx and m.from_y == by
-                            ]
+                            legal_moves_from_selected = game.get_legal_moves_from(bx, by)
                     else:
                         # Click same square -> deselect
                         if (bx, by) == selected_square:
@@ -314,17 +522,14 @@ def main():
                                     ui_state = "promotion"
                                 else:
                                     move = candidate_moves[0]
-                                    game.make_move(move)
+                                    worker.play(game, move)
                                     selected_square = None
                                     legal_moves_from_selected = []
                             else:
                                 # Maybe select another own piece
                                 if sq.piece and sq.piece.color == current_color:
                                     selected_square = (bx, by)
-                                    all_legal = game.get_legal_moves_for_current_player()
-                                    legal_moves_from_selected = [
-                                        m for m in all_legal if m.from_x == bx and m.from_y == by
-                                    ]
+                                    legal_moves_from_selected = game.get_legal_moves_from(bx, by)
                                 else:
                                     selected_square = None
                                     legal_moves_from_selected = []
@@ -333,13 +538,12 @@ def main():
             elif ui_state == "promotion":
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     mx, my = event.pos
-                    for rect, move in zip(promotion_rects, promotion_moves):
+                    for rect, move in zip(renderer.promotion_rects, promotion_moves):
                         if rect.collidepoint(mx, my):
                             if game:
-                                game.make_move(move)
+                                worker.play(game, move)
                             ui_state = "playing"
                             promotion_moves = []
-                            promotion_rects = []
                             selected_square = None
                             legal_moves_from_selected = []
                             break
@@ -348,18 +552,19 @@ def main():
             elif ui_state == "game_over":
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     mx, my = event.pos
-                    if play_again_rect and play_again_rect.collidepoint(mx, my):
-                        game = Game()
-                        game.start_game()
+                    if renderer.play_again_button and renderer.play_again_button.collidepoint(mx, my):
+                        game = new_game()
                         ui_state = "playing"
                         selected_square = None
                         legal_moves_from_selected = []
-                    elif menu_rect and menu_rect.collidepoint(mx, my):
+                    elif renderer.menu_button and renderer.menu_button.collidepoint(mx, my):
+                        worker.cancel()
                         game = None
                         ui_state = "menu"
                         selected_square = None
                         legal_moves_from_selected = []
 
+    worker.cancel()
     pygame.quit()
     sys.exit()
 
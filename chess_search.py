@@ -0,0 +1,515 @@
+# chess_search.py
+# Alpha-beta search for chess_engine: negamax with iterative deepening,
+# quiescence search, move ordering and a transposition table
+#
+# Usage:
+#   result = Searcher().search(game, depth=4)          # or movetime=2.0
+#   game.make_move(result.move)
+#   Searcher(book=chess_book.OpeningBook("book.bin"))  # book moves first
+#   Searcher(tablebase=chess_tablebase.Tablebase("tables/"))  # exact endgames
+#
+# With workers > 1 the root moves are split across a process pool; each
+# worker gets the position as FEN plus the hashes of earlier positions.
+# Run this file to compare parallel and single-process search times.
+
+import sys
+import time
+from multiprocessing import Pool
+
+from chess_engine import Game, Move, MoveValidator, LegalMoveGenerator
+from chess_eval import PIECE_VALUES, evaluate
+import chess_profile
+
+MATE = 100000
+MATE_BOUND = MATE - 1000  # scores beyond this are forced mates
+INF = MATE + 1
+MAX_PLY = 64
+
+# Transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """Fixed-size table indexed by the low bits of the Zobrist hash.
+
+    Each slot holds (depth, score, bound, packed move, generation). A slot is
+    overwritten unless it holds a deeper result for a different position
+    from the current search; entries from earlier searches always give way.
+    """
+
+    def __init__(self, bits=18):
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.keys = [0] * self.size
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.keys = [0] * self.size
+        self.entries = [None] * self.size
+
+    def probe(self, key):
+        i = key & self.mask
+        if self.keys[i] == key:
+            return self.entries[i]
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        i = key & self.mask
+        old = self.entries[i]
+        if old is not None:
+            if self.keys[i] == key:
+                if not move:
+                    move = old[3]
+            elif old[4] == self.generation and old[0] > depth:
+                return
+        self.keys[i] = key
+        self.entries[i] = (depth, score, bound, move, self.generation)
+
+
+class SearchResult:
+    def __init__(self, move, score, pv, nodes, depth, seconds):
+        self.move = move
+        self.score = score
+        self.pv = pv
+        self.nodes = nodes
+        self.depth = depth
+        self.seconds = seconds
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.seconds) if self.seconds else 0
+
+    def __repr__(self):
+        pv = " ".join(m.uci() for m in self.pv)
+        return (f"SearchResult(depth={self.depth}, score={self.score}, "
+                f"nodes={self.nodes}, pv={pv})")
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _tb_score(result, plies, ply):
+    # Tablebase win/draw/loss and distance to mate as a search score
+    if result > 0:
+        return MATE - ply - plies
+    if result < 0:
+        return -MATE + ply + plies
+    return 0
+
+
+def _score_from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Searcher:
+    def __init__(self, tt_bits=18, evaluate=evaluate, book=None, tablebase=None):
+        self.tt = TranspositionTable(tt_bits)
+        # White-relative static eval; chess_eval.evaluate_position also fits
+        self.evaluate = evaluate
+        # chess_book.OpeningBook consulted before searching, if given
+        self.book = book
+        # chess_tablebase.Tablebase probed in positions with 3 or fewer pieces
+        self.tablebase = tablebase
+        self.pieces = 32
+        self.legal_gen = LegalMoveGenerator()
+        self.val = MoveValidator()
+        self.tt_bits = tt_bits
+        self.stopped = False
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 * 64 * 64)
+        # Called with a SearchResult after every completed iteration
+        self.on_iteration = None
+        self.deadline = None
+        self.stop_event = None
+        self._pool = None
+        self._pool_size = 0
+
+    def stop(self):
+        """Ask a running search (e.g. in another thread) to return early."""
+        self.stopped = True
+
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+            self._pool_size = 0
+
+    def search(self, game, depth=None, movetime=None, workers=1, root_moves=None,
+               stop_event=None):
+        """Search the current position of game; at least one of depth
+        (plies) or movetime (seconds) limits it. The game is not modified.
+        root_moves restricts the moves considered at the root. Setting
+        stop_event (a threading.Event) ends the search like stop(), even if
+        it is set before the search starts."""
+        if depth is None and movetime is None:
+            depth = 4
+        if self.book is not None and root_moves is None:
+            start = time.perf_counter()
+            move = self.book.pick(game)
+            if move is not None:
+                return SearchResult(move, 0, [move], 0, 0, time.perf_counter() - start)
+        if self.tablebase is not None and root_moves is None:
+            start = time.perf_counter()
+            hit = self.tablebase.best_move(game)
+            if hit is not None:
+                move, result, plies = hit
+                return SearchResult(move, _tb_score(result, plies, 0), [move], 0, 0,
+                                    time.perf_counter() - start)
+        if workers > 1:
+            return self._search_parallel(game, depth, movetime, workers, root_moves)
+        max_depth = min(depth or MAX_PLY - 1, MAX_PLY - 1)
+
+        work = game.copy()
+        board, state = work.board, work.state
+        start = time.perf_counter()
+        self.deadline = start + movetime if movetime else None
+        self.stop_event = stop_event
+        self.stopped = stop_event is not None and stop_event.is_set()
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (2 * 64 * 64)
+        self.path = []
+        # Positions from the game so far count as draws if reached again
+        self.seen = work.history.positions
+        self.tt.new_search()
+        # Kept current through captures so tablebase probes stay cheap
+        self.pieces = sum(len(squares) for side in board.piece_squares for squares in side)
+
+        moves = self.legal_gen.generate_legal_moves(board, state.turn, state)
+        if root_moves is not None:
+            moves = [m for m in moves if m in root_moves]
+        if not moves:
+            in_check = self.val.is_in_check(board, state.turn, state)
+            return SearchResult(None, -MATE if in_check else 0, [], 0, 0, 0.0)
+
+        result = SearchResult(moves[0], 0, [moves[0]], 0, 0, 0.0)
+        for d in range(1, max_depth + 1):
+            score, move = self._root(board, state, moves, d)
+            if move is None:
+                break
+            elapsed = time.perf_counter() - start
+            result = SearchResult(move, score, self._pv(board, state, move, d),
+                                  self.nodes, d, elapsed)
+            if self.on_iteration and not self.stopped:
+                self.on_iteration(result)
+            if self.stopped or abs(score) > MATE_BOUND:
+                break
+            # The next iteration would not finish in the time left
+            if self.deadline and elapsed > movetime / 2:
+                break
+
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _search_parallel(self, game, depth, movetime, workers, root_moves):
+        # Root splitting: every worker searches its share of the root moves
+        # to the full depth with its own TT; the best score wins
+        start = time.perf_counter()
+        moves = game.get_legal_moves_for_current_player()
+        if root_moves is not None:
+            moves = [m for m in moves if m in root_moves]
+        if len(moves) < 2:
+            return self.search(game, depth, movetime, 1, moves)
+
+        # Deal moves round-robin in a cheap static order so every worker
+        # gets some of the likely best ones
+        ordered = self._order(game.board, moves, 0, -1)
+        shares = [ordered[i::workers] for i in range(workers)]
+        fen = game.fen()
+        seen = list(game.history.positions)
+        jobs = [(game.board_class, fen, seen, [m.uci() for m in share],
+                 depth, movetime, self.tt_bits, self.evaluate, self.tablebase)
+                for share in shares if share]
+
+        if self._pool is None or self._pool_size != workers:
+            self.close()
+            self._pool = Pool(workers)
+            self._pool_size = workers
+        results = list(chess_profile.pool_map(self._pool.map, _search_worker, jobs))
+
+        by_uci = {m.uci(): m for m in moves}
+        best = max(results, key=lambda r: r[1])
+        nodes = sum(r[3] for r in results)
+        pv = _replay_pv(game, best[2])
+        return SearchResult(by_uci[best[0]], best[1], pv, nodes,
+                            min(r[4] for r in results), time.perf_counter() - start)
+
+    def _check_time(self):
+        if self.deadline and time.perf_counter() >= self.deadline:
+            self.stopped = True
+        elif self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+
+    def _root(self, board, state, moves, depth):
+        key = board.zobrist ^ state.zobrist
+        entry = self.tt.probe(key)
+        ordered = self._order(board, moves, entry[3] if entry else 0, 0)
+        alpha = -INF
+        best_move = None
+        self.path.append(key)
+        for m in ordered:
+            board.make_move(m, state)
+            if m.captured:
+                self.pieces -= 1
+            score = -self._negamax(board, state, depth - 1, -INF, -alpha, 1)
+            board.unmake_move(state)
+            if m.captured:
+                self.pieces += 1
+            # A partial iteration still searched the previous best move first
+            if self.stopped:
+                break
+            if score > alpha:
+                alpha = score
+                best_move = m
+        self.path.pop()
+        if best_move is not None and not self.stopped:
+            self.tt.store(key, depth, alpha, EXACT, best_move.pack())
+        return alpha, best_move
+
+    def _negamax(self, board, state, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_time()
+        if self.stopped:
+            return 0
+
+        key = board.zobrist ^ state.zobrist
+        if key in self.seen or key in self.path:
+            return 0
+
+        if self.pieces <= 3 and self.tablebase is not None:
+            hit = self.tablebase.probe(board, state)
+            if hit is not None:
+                return _tb_score(hit[0], hit[1], ply)
+
+        entry = self.tt.probe(key)
+        tt_move = 0
+        if entry:
+            tt_move = entry[3]
+            if entry[0] >= depth:
+                score = _score_from_tt(entry[1], ply)
+                bound = entry[2]
+                if (bound == EXACT or (bound == LOWER and score >= beta) or
+                        (bound == UPPER and score <= alpha)):
+                    return score
+
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiesce(board, state, alpha, beta, ply)
+
+        moves = self.legal_gen.generate_legal_moves(board, state.turn, state)
+        if not moves:
+            if self.val.is_in_check(board, state.turn, state):
+                return -MATE + ply
+            return 0
+
+        alpha0 = alpha
+        best = -INF
+        best_move = None
+        self.path.append(key)
+        for m in self._order(board, moves, tt_move, ply):
+            board.make_move(m, state)
+            if m.captured:
+                self.pieces -= 1
+            score = -self._negamax(board, state, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move(state)
+            if m.captured:
+                self.pieces += 1
+            if self.stopped:
+                break
+            if score > best:
+                best = score
+                best_move = m
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not m.captured:
+                            self._record_cutoff(board, m, depth, ply)
+                        break
+        self.path.pop()
+        if self.stopped:
+            return 0
+
+        if best <= alpha0:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, _score_to_tt(best, ply), bound, best_move.pack())
+        return best
+
+    def _quiesce(self, board, state, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_time()
+        if self.stopped:
+            return 0
+
+        stand = self.evaluate(board)
+        if state.turn == "Black":
+            stand = -stand
+        if stand >= beta:
+            return stand
+        if stand > alpha:
+            alpha = stand
+
+        moves = self.legal_gen.generate_legal_moves(board, state.turn, state)
+        if not moves:
+            if self.val.is_in_check(board, state.turn, state):
+                return -MATE + ply
+            return 0
+
+        captures = [m for m in moves if m.captured or m.promotion == "Queen"]
+        for m in self._order(board, captures, 0, -1):
+            board.make_move(m, state)
+            score = -self._quiesce(board, state, -beta, -alpha, ply + 1)
+            board.unmake_move(state)
+            if self.stopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _order(self, board, moves, tt_move, ply):
+        # TT move, then captures by MVV-LVA and queen promotions, then
+        # killers, then quiet moves by history score
+        if not moves:
+            return moves
+        squares = board.squares
+        killers = self.killers[ply] if ply >= 0 else (0, 0)
+        history = self.history
+        first = moves[0]
+        side = squares[first.from_x][first.from_y].piece.side << 12
+        scored = []
+        for m in moves:
+            code = m.pack()
+            if code == tt_move:
+                s = 1 << 30
+            elif m.captured or m.promotion:
+                attacker = squares[m.from_x][m.from_y].piece
+                victim = PIECE_VALUES[m.captured.kind] if m.captured else 0
+                if m.promotion == "Queen":
+                    victim += PIECE_VALUES[4]
+                s = (1 << 24) + victim * 10 - PIECE_VALUES[attacker.kind]
+            elif code == killers[0]:
+                s = 1 << 23
+            elif code == killers[1]:
+                s = (1 << 23) - 1
+            else:
+                s = history[side | (code & 4095)]
+            scored.append((s, code, m))
+        scored.sort(key=lambda t: t[0], reverse=True)
+        return [m for _, _, m in scored]
+
+    def _record_cutoff(self, board, move, depth, ply):
+        code = move.pack()
+        killers = self.killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+        i = board.squares[move.from_x][move.from_y].piece.side << 12 | (code & 4095)
+        self.history[i] = min(self.history[i] + depth * depth, 1 << 22)
+
+    def _pv(self, board, state, first, depth):
+        # Follow best moves stored in the TT from the root
+        pv = [first]
+        board.make_move(first, state)
+        seen = {board.zobrist ^ state.zobrist}
+        while len(pv) < depth:
+            entry = self.tt.probe(board.zobrist ^ state.zobrist)
+            if not entry or not entry[3]:
+                break
+            m = Move.unpack(entry[3], board)
+            legal = self.legal_gen.generate_legal_moves(board, state.turn, state)
+            if m not in legal:
+                break
+            board.make_move(m, state)
+            pv.append(m)
+            key = board.zobrist ^ state.zobrist
+            if key in seen:
+                break
+            seen.add(key)
+        for _ in pv:
+            board.unmake_move(state)
+        return pv
+
+
+# --- Process pool workers ---
+
+def _search_worker(args):
+    board_class, fen, seen, ucis, depth, movetime, tt_bits, evaluate, tablebase = args
+    game = Game(board_class)
+    game.load_fen(fen)
+    game.history.positions = dict.fromkeys(seen, 1)
+    moves = [m for m in game.get_legal_moves_for_current_player() if m.uci() in ucis]
+    r = Searcher(tt_bits, evaluate, tablebase=tablebase).search(game, depth, movetime,
+                                                                root_moves=moves)
+    return r.move.uci(), r.score, [m.uci() for m in r.pv], r.nodes, r.depth
+
+
+def _replay_pv(game, ucis):
+    # Turn a worker's PV back into Move objects for this game
+    work = game.copy()
+    pv = []
+    for uci in ucis:
+        m = next((m for m in work.get_legal_moves_for_current_player() if m.uci() == uci), None)
+        if m is None:
+            break
+        pv.append(m)
+        work.board.make_move(m, work.state)
+        work._clear_legal_cache()
+    return pv
+
+
+# Fixed middlegame positions for comparing parallel and serial search
+BENCH_POSITIONS = [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - -",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq -",
+    "rnbq1rk1/ppp1bppp/4pn2/3p4/2PP4/2N2N2/PP2PPPP/R1BQKB1R w KQ -",
+]
+
+
+def benchmark(workers, depth=3):
+    """Search every bench position with 1 and with `workers` processes."""
+    serial = parallel = 0.0
+    searcher = Searcher()
+    for fen in BENCH_POSITIONS:
+        game = Game()
+        game.load_fen(fen)
+        searcher.search(game, depth=1, workers=workers)  # start the pool
+        t0 = time.perf_counter()
+        r1 = Searcher().search(game, depth=depth)
+        t1 = time.perf_counter()
+        r2 = searcher.search(game, depth=depth, workers=workers)
+        t2 = time.perf_counter()
+        serial += t1 - t0
+        parallel += t2 - t1
+        print(f"{fen}\n  1 worker : {r1.move.uci()} {r1.score:6d} {t1 - t0:7.2f}s"
+              f"\n  {workers} workers: {r2.move.uci()} {r2.score:6d} {t2 - t1:7.2f}s")
+    searcher.close()
+    print(f"total {serial:.2f}s vs {parallel:.2f}s, speedup {serial / parallel:.2f}x")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+              int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,119 @@
+# chess_selfplay.py
+# Headless self-play: plays many games through Game.make_move and streams
+# one JSON line per finished game to disk
+#
+# Usage:
+#   python chess_selfplay.py --games 1000 --workers 4 --out games.jsonl
+#   python chess_selfplay.py --games 20 --white engine --depth 2
+
+import argparse
+import json
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from chess_engine import Game
+from chess_search import Searcher
+import chess_profile
+
+PLAYERS = ("random", "engine")
+
+
+def game_seed(base_seed, index):
+    """Seed for game number index; the same whatever worker plays it."""
+    return f"{base_seed}-{index}"
+
+
+def play_game(index, base_seed=0, white="random", black="random",
+              max_moves=200, depth=2, movetime=None):
+    """Plays one game to completion and returns its record as a dict."""
+    rng = random.Random(game_seed(base_seed, index))
+    players = {"White": white, "Black": black}
+    searcher = Searcher(tt_bits=16) if "engine" in players.values() else None
+
+    game = Game()
+    game.start_game()
+    moves = []
+    t0 = time.perf_counter()
+    while not game.game_over and len(moves) < max_moves:
+        if players[game.state.turn] == "engine":
+            limit = {"movetime": movetime} if movetime else {"depth": depth}
+            move = searcher.search(game, **limit).move
+        else:
+            move = rng.choice(game.get_legal_moves_for_current_player())
+        game.make_move(move)
+        moves.append(move.uci())
+
+    result = game.result()
+    reason = game.game_over_reason if game.game_over else "Move limit"
+
+    return {
+        "game": index,
+        "seed": game_seed(base_seed, index),
+        "white": white,
+        "black": black,
+        "result": result,
+        "reason": reason,
+        "plies": len(moves),
+        "seconds": round(time.perf_counter() - t0, 4),
+        "moves": moves,
+    }
+
+
+def _play(args):
+    index, kwargs = args
+    return play_game(index, **kwargs)
+
+
+def run_batch(games, out, workers=1, **kwargs):
+    """Plays games across a process pool, writing each record to the file
+    out as soon as it finishes. Returns a summary of results."""
+    summary = {"games": 0, "1-0": 0, "0-1": 0, "1/2-1/2": 0, "*": 0, "plies": 0}
+    jobs = ((i, kwargs) for i in range(games))
+    t0 = time.perf_counter()
+    with open(out, "w") as f:
+        if workers > 1:
+            pool = Pool(workers)
+            records = chess_profile.pool_map(pool.imap_unordered, _play, jobs)
+        else:
+            pool = None
+            records = map(_play, jobs)
+        try:
+            for rec in records:
+                f.write(json.dumps(rec) + "\n")
+                f.flush()
+                summary["games"] += 1
+                summary[rec["result"]] += 1
+                summary["plies"] += rec["plies"]
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    summary["seconds"] = round(time.perf_counter() - t0, 3)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless chess self-play")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default="selfplay.jsonl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--white", choices=PLAYERS, default="random")
+    parser.add_argument("--black", choices=PLAYERS, default="random")
+    parser.add_argument("--max-moves", type=int, default=200, help="plies before the game is stopped")
+    parser.add_argument("--depth", type=int, default=2, help="engine search depth")
+    parser.add_argument("--movetime", type=float, help="engine seconds per move instead of depth")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.games, args.out, args.workers,
+                        base_seed=args.seed, white=args.white, black=args.black,
+                        max_moves=args.max_moves, depth=args.depth,
+                        movetime=args.movetime)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# chess_server.py
+# asyncio server hosting many concurrent Game sessions over a line-based
+# JSON protocol (TCP or Unix socket)
+#
+# Each request is one JSON object per line; each reply is one JSON line.
+# An "id" field in a request is echoed back in its reply.
+#   {"op": "new", "fen": "<optional FEN>"}        -> {"session": "...", ...status}
+#   {"op": "move", "session": "...", "move": "e2e4"} -> status after the move
+#   {"op": "legal", "session": "..."}             -> {"moves": ["e2e4", ...]}
+#   {"op": "status", "session": "..."}            -> status
+#   {"op": "close", "session": "..."}
+# Status replies carry fen, turn, game_over, reason, result and the legal
+# moves. Errors come back as {"ok": false, "error": "..."}.
+#
+# Move validation, end-of-game detection and legal move generation run in a
+# thread pool, so a slow position does not hold up the event loop; a
+# per-session lock keeps operations on one game in order.
+#
+# Usage:
+#   python chess_server.py --port 8765
+#   python chess_server.py --unix /tmp/chess.sock
+#   python chess_loadgen.py --port 8765 --sessions 200
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chess_engine import Game
+
+
+class Session:
+    __slots__ = ("game", "lock", "last_used")
+
+    def __init__(self, game):
+        self.game = game
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+def _status(game):
+    # Runs in the executor: the legal move list may have to be generated
+    return {
+        "fen": game.fen(),
+        "turn": game.state.turn,
+        "game_over": game.game_over,
+        "reason": game.game_over_reason,
+        "result": game.result(),
+        "legal": [m.uci() for m in game.get_legal_moves_for_current_player()],
+    }
+
+
+def _new_game(fen):
+    game = Game()
+    if fen:
+        game.load_fen(fen)
+    else:
+        game.start_game()
+    return game, _status(game)
+
+
+def _play(game, uci):
+    if game.game_over:
+        raise ValueError(f"game is over: {game.game_over_reason}")
+    move = game.move_from_uci(uci)
+    if move is None:
+        raise ValueError(f"illegal move {uci}")
+    game.make_move(move)
+    return _status(game)
+
+
+def _field(request, name, required=True):
+    # A string field of the request; None if optional and absent
+    value = request.get(name)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string")
+    return value
+
+
+class ChessServer:
+    """Keeps Game sessions by ID and serves the JSON-lines protocol."""
+
+    def __init__(self, workers=4, idle_timeout=None):
+        self.sessions = {}
+        self.executor = ThreadPoolExecutor(workers)
+        self.idle_timeout = idle_timeout
+        self._ids = itertools.count(1)
+        self.requests = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _session(self, request):
+        session = self.sessions.get(_field(request, "session"))
+        if session is None:
+            raise ValueError("unknown session")
+        session.last_used = time.monotonic()
+        return session
+
+    async def handle(self, request):
+        """Reply dict for one request dict."""
+        op = request.get("op")
+        if op == "new":
+            game, status = await self._run(_new_game, _field(request, "fen", required=False))
+            sid = str(next(self._ids))
+            self.sessions[sid] = Session(game)
+            return {"session": sid, **status}
+        if op == "close":
+            if self.sessions.pop(_field(request, "session"), None) is None:
+                raise ValueError("unknown session")
+            return {}
+
+        session = self._session(request)
+        async with session.lock:
+            if op == "move":
+                return await self._run(_play, session.game, _field(request, "move"))
+            if op == "status":
+                return await self._run(_status, session.game)
+            if op == "legal":
+                status = await self._run(_status, session.game)
+                return {"moves": status["legal"]}
+        raise ValueError(f"unknown op {op!r}")
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.requests += 1
+                request = {}
+                try:
+                    decoded = json.loads(line)
+                    if not isinstance(decoded, dict):
+                        raise ValueError("request must be a JSON object")
+                    request = decoded
+                    reply = {"ok": True, **await self.handle(request)}
+                except ValueError as e:  # includes bad JSON and bad FEN
+                    reply = {"ok": False, "error": str(e)}
+                except Exception as e:
+                    # One bad request must not end the connection's other sessions
+                    reply = {"ok": False, "error": f"internal error: {type(e).__name__}: {e}"}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def expire_sessions(self):
+        """Drops sessions left idle for longer than idle_timeout seconds."""
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            cutoff = time.monotonic() - self.idle_timeout
+            for sid in [sid for sid, s in self.sessions.items() if s.last_used < cutoff]:
+                del self.sessions[sid]
+
+
+async def serve(host="127.0.0.1", port=8765, unix=None, workers=4, idle_timeout=None):
+    server = ChessServer(workers, idle_timeout)
+    if unix:
+        listener = await asyncio.start_unix_server(server.serve_client, unix)
+    else:
+        listener = await asyncio.start_server(server.serve_client, host, port)
+    if idle_timeout:
+        asyncio.get_running_loop().create_task(server.expire_sessions())
+    where = unix or f"{host}:{port}"
+    print(f"serving on {where} with {workers} executor threads", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-game chess server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=4, help="executor threads")
+    parser.add_argument("--idle-timeout", type=float,
+                        help="drop sessions idle for this many seconds")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.idle_timeout))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
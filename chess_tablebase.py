@@ -0,0 +1,363 @@
+# chess_tablebase.py
+# Retrograde endgame tablebases for king + one piece against a lone king
+# (KQK, KRK, KPK), with memory-mapped O(1) probing
+#
+# Every position of a material set is enumerated and its moves generated
+# with the engine's own LegalMoveGenerator; values are then propagated back
+# from the mates, one ply at a time, giving win/draw/loss with distance to
+# mate in plies. The side with the extra piece is stored as White (probes
+# flip colors as needed). Pawnless sets put the white king in the a1-d1-d4
+# triangle using the 8 board symmetries; KPK mirrors the pawn onto files a-d.
+#
+# File layout: header (8s magic, 4s name, u32 size), then one byte per
+# position index: 0 = draw (or not a legal position), 1..127 = side to
+# move wins with that many plies to mate, 128 + n = side to move is mated
+# in n plies.
+#
+# Usage:
+#   python chess_tablebase.py generate tables/        # all sets, about 15s
+#   python chess_tablebase.py probe tables/ --fen "8/8/8/4k3/8/8/8/4K2R w - -"
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from chess_engine import (Board, Game, GameState, LegalMoveGenerator, MoveValidator,
+                          PIECES, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+
+MAGIC = b"CHESSTB1"
+HEADER = struct.Struct("<8s4sI")
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+# Extra (white) piece kind of each set; KPK needs KQK and KRK for promotions
+SETS = {"KQK": QUEEN, "KRK": ROOK, "KPK": PAWN}
+SET_NAMES = {kind: name for name, kind in SETS.items()}
+GENERATE_ORDER = ["KQK", "KRK", "KPK"]
+
+
+# --- Indexing ---
+
+def _transform(f):
+    return [f(sq % 8, sq // 8) for sq in range(64)]
+
+
+# The 8 symmetries of the board as square -> square maps
+SYMMETRIES = [
+    _transform(lambda x, y: y * 8 + x),
+    _transform(lambda x, y: y * 8 + 7 - x),
+    _transform(lambda x, y: (7 - y) * 8 + x),
+    _transform(lambda x, y: (7 - y) * 8 + 7 - x),
+    _transform(lambda x, y: x * 8 + y),
+    _transform(lambda x, y: x * 8 + 7 - y),
+    _transform(lambda x, y: (7 - x) * 8 + y),
+    _transform(lambda x, y: (7 - x) * 8 + 7 - y),
+]
+TRIANGLE = [sq for sq in range(64) if sq % 8 <= 3 and sq // 8 <= sq % 8]
+TRIANGLE_INDEX = {sq: i for i, sq in enumerate(TRIANGLE)}
+# Symmetry that takes a white king square into the triangle
+KING_SYMMETRY = [next(t for t in SYMMETRIES if t[sq] in TRIANGLE_INDEX) for sq in range(64)]
+MIRROR = SYMMETRIES[1]
+FLIP = SYMMETRIES[2]  # swaps ranks, used to turn Black into White
+
+PAWN_SQUARES = [y * 8 + x for y in range(1, 7) for x in range(4)]
+PAWN_INDEX = {sq: i for i, sq in enumerate(PAWN_SQUARES)}
+
+
+def table_size(name):
+    return 2 * (24 if SETS[name] == PAWN else 10) * 64 * 64
+
+
+def position_index(name, stm, wk, bk, sq):
+    """Index of a position with White holding the extra piece on sq; stm is
+    WHITE or BLACK. Squares are y * 8 + x."""
+    if SETS[name] == PAWN:
+        if sq % 8 > 3:
+            wk, bk, sq = MIRROR[wk], MIRROR[bk], MIRROR[sq]
+        return ((stm * 24 + PAWN_INDEX[sq]) * 64 + wk) * 64 + bk
+    t = KING_SYMMETRY[wk]
+    return ((stm * 10 + TRIANGLE_INDEX[t[wk]]) * 64 + t[bk]) * 64 + t[sq]
+
+
+def _decode(name, index):
+    rest, bk_or_sq = divmod(index, 64)
+    rest, mid = divmod(rest, 64)
+    stm, first = divmod(rest, 24 if SETS[name] == PAWN else 10)
+    if SETS[name] == PAWN:
+        return stm, mid, bk_or_sq, PAWN_SQUARES[first]
+    return stm, TRIANGLE[first], mid, bk_or_sq
+
+
+def _encode_value(result, plies):
+    if result == WIN:
+        return plies
+    if result == LOSS:
+        return 128 + plies
+    return 0
+
+
+def _decode_value(v):
+    if v == 0:
+        return DRAW, 0
+    if v < 128:
+        return WIN, v
+    return LOSS, v - 128
+
+
+# --- Generation ---
+
+def _successors(name, stm, wk, bk, sq, board, state, legal_gen, val, probe_other):
+    """Legal moves of one position as a list of successor indices or
+    (result, plies) pairs for moves that leave the set; None if the
+    position is not legal."""
+    kind = SETS[name]
+    white_king = PIECES[WHITE][KING]
+    black_king = PIECES[BLACK][KING]
+    board.put_piece(wk % 8, wk // 8, white_king)
+    board.put_piece(bk % 8, bk // 8, black_king)
+    board.put_piece(sq % 8, sq // 8, PIECES[WHITE][kind])
+    if state.turn != ("White", "Black")[stm]:
+        state.switch_turn()
+    try:
+        # The side not to move must not be in check
+        if val.is_in_check(board, ("Black", "White")[stm], state):
+            return None
+        moves = legal_gen.generate_legal_moves(board, state.turn, state)
+        if not moves and val.is_in_check(board, state.turn, state):
+            return "mated"
+        out = []
+        for m in moves:
+            frm = m.from_y * 8 + m.from_x
+            to = m.to_y * 8 + m.to_x
+            if m.captured is not None:
+                out.append((DRAW, 0))  # bare kings
+            elif m.promotion:
+                promoted = SETS.get("K" + ("N" if m.promotion == "Knight" else m.promotion[0]) + "K")
+                if promoted is None:
+                    out.append((DRAW, 0))  # KBK, KNK
+                else:
+                    out.append(probe_other(SET_NAMES[promoted], BLACK, wk, bk, to))
+            elif frm == wk:
+                out.append(position_index(name, 1 - stm, to, bk, sq))
+            elif frm == bk:
+                out.append(position_index(name, 1 - stm, wk, to, sq))
+            else:
+                out.append(position_index(name, 1 - stm, wk, bk, to))
+        return out
+    finally:
+        board.remove_piece(wk % 8, wk // 8)
+        board.remove_piece(bk % 8, bk // 8)
+        board.remove_piece(sq % 8, sq // 8)
+
+
+def generate(name, directory, out=None):
+    """Builds the table for one material set and writes it to directory.
+    Sets it depends on must already be there. Returns the values."""
+    t0 = time.perf_counter()
+    size = table_size(name)
+    board = Board()
+    state = GameState()
+    state.set_castling_bits(0)
+    legal_gen = LegalMoveGenerator()
+    val = MoveValidator()
+    others = {}
+
+    def probe_other(other, stm, wk, bk, sq):
+        # Value for the side to move after a promotion, from its own table
+        if other not in others:
+            others[other] = load_table(directory, other)
+        return _decode_value(others[other][position_index(other, stm, wk, bk, sq)])
+
+    values = bytearray(size)
+    resolved = bytearray(size)
+    preds = [[] for _ in range(size)]
+    count = [0] * size
+    # Positions decided at each distance: (index, is_win) candidates, or
+    # (index, None) for "one more move leads to an opponent win"
+    buckets = {}
+    mated = []
+
+    for index in range(size):
+        stm, wk, bk, sq = _decode(name, index)
+        if len({wk, bk, sq}) < 3 or abs(wk % 8 - bk % 8) <= 1 and abs(wk // 8 - bk // 8) <= 1:
+            resolved[index] = 1
+            continue
+        succ = _successors(name, stm, wk, bk, sq, board, state, legal_gen, val, probe_other)
+        if succ is None:
+            resolved[index] = 1
+        elif succ == "mated":
+            mated.append(index)
+        else:
+            for s in succ:
+                count[index] += 1
+                if isinstance(s, int):
+                    preds[s].append(index)
+                elif s[0] == LOSS:
+                    buckets.setdefault(s[1] + 1, []).append((index, True))
+                elif s[0] == WIN:
+                    buckets.setdefault(s[1] + 1, []).append((index, None))
+            if not succ:
+                resolved[index] = 1  # stalemate
+
+    def settle(index, result, plies):
+        resolved[index] = 1
+        values[index] = _encode_value(result, plies)
+        for p in preds[index]:
+            if not resolved[p]:
+                buckets.setdefault(plies + 1, []).append((p, True if result == LOSS else None))
+
+    for index in mated:
+        settle(index, LOSS, 0)
+    plies = 1
+    while any(level >= plies for level in buckets):
+        for index, is_win in buckets.pop(plies, ()):
+            if resolved[index]:
+                continue
+            if is_win:
+                settle(index, WIN, plies)
+            else:
+                count[index] -= 1
+                if not count[index]:
+                    settle(index, LOSS, plies)
+        plies += 1
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name + ".tb"), "wb") as f:
+        f.write(HEADER.pack(MAGIC, name.encode(), size))
+        f.write(values)
+    if out is not None:
+        wins = sum(1 for v in values if 0 < v < 128)
+        losses = sum(1 for v in values if v >= 128)
+        print(f"{name}: {size} positions, {wins} wins, {losses} losses, longest "
+              f"{max(values[i] & 127 for i in range(size))} plies, "
+              f"{time.perf_counter() - t0:.1f}s", file=out)
+    return values
+
+
+def generate_all(directory, out=sys.stdout):
+    for name in GENERATE_ORDER:
+        generate(name, directory, out)
+
+
+def load_table(directory, name):
+    """The values of one table as a read-only memory map."""
+    with open(os.path.join(directory, name + ".tb"), "rb") as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, stored, size = HEADER.unpack_from(m, 0)
+    if magic != MAGIC or stored.rstrip(b"\0") != name.encode() or len(m) != HEADER.size + size:
+        m.close()
+        raise ValueError(f"{name}.tb in {directory} is not a valid table")
+    return memoryview(m)[HEADER.size:]
+
+
+# --- Probing ---
+
+class Tablebase:
+    """The tables found in a directory. probe() answers any position with
+    two kings and at most one other piece; KK, KBK and KNK are drawn
+    without a table."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        for name in SETS:
+            if os.path.exists(os.path.join(directory, name + ".tb")):
+                self.tables[name] = load_table(directory, name)
+
+    # Pickled by directory, so pool workers map the same files
+    def __reduce__(self):
+        return Tablebase, (self.directory,)
+
+    def probe(self, board, state):
+        """(WIN/DRAW/LOSS for the side to move, plies to mate), or None if
+        the position is not covered."""
+        if state.get_castling_bits():
+            return None
+        kings = [None, None]
+        extra = None
+        for side, kinds in enumerate(board.piece_squares):
+            for kind, squares in enumerate(kinds):
+                for x, y in squares:
+                    if kind == KING:
+                        kings[side] = y * 8 + x
+                    elif extra is None:
+                        extra = (PIECES[side][kind], y * 8 + x)
+                    else:
+                        return None
+        if extra is None:
+            return DRAW, 0
+        piece, sq = extra
+        if piece.kind in (KNIGHT, BISHOP):
+            return DRAW, 0
+        table = self.tables.get(SET_NAMES[piece.kind])
+        if table is None:
+            return None
+        stm = WHITE if state.turn == "White" else BLACK
+        wk, bk = kings
+        if piece.side == BLACK:
+            wk, bk, sq, stm = FLIP[bk], FLIP[wk], FLIP[sq], 1 - stm
+        return _decode_value(table[position_index(SET_NAMES[piece.kind], stm, wk, bk, sq)])
+
+    def probe_game(self, game):
+        return self.probe(game.board, game.state)
+
+    def best_move(self, game):
+        """(move, result, plies) with the fastest win, a draw, or the
+        slowest loss for the side to move; None if not covered."""
+        board, state = game.board, game.state
+        if self.probe(board, state) is None:
+            return None
+        best = None
+        best_key = None
+        for m in game.get_legal_moves_for_current_player():
+            board.make_move(m, state)
+            hit = self.probe(board, state)
+            board.unmake_move(state)
+            if hit is None:
+                continue
+            result, plies = -hit[0], hit[1] + 1
+            # Prefer wins (sooner is better), then draws, then later losses
+            key = (result, -plies if result == WIN else plies)
+            if best_key is None or key > best_key:
+                best, best_key = (m, result, plies), key
+        return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Endgame tablebases")
+    sub = parser.add_subparsers(dest="command", required=True)
+    g = sub.add_parser("generate", help="build tables into a directory")
+    g.add_argument("directory")
+    g.add_argument("--set", choices=GENERATE_ORDER, help="build only this set")
+    p = sub.add_parser("probe", help="look up a position")
+    p.add_argument("directory")
+    p.add_argument("--fen", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        if args.set:
+            generate(args.set, args.directory, sys.stdout)
+        else:
+            generate_all(args.directory)
+        return 0
+
+    game = Game()
+    game.load_fen(args.fen)
+    tb = Tablebase(args.directory)
+    hit = tb.probe_game(game)
+    if hit is None:
+        print("not in the tablebases")
+        return 1
+    result, plies = hit
+    print({WIN: "win", DRAW: "draw", LOSS: "loss"}[result], f"in {plies} plies" if result else "")
+    best = tb.best_move(game)
+    if best:
+        print("best move", best[0].uci())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# chess_uci.py
+# UCI front end for chess_engine and chess_search, for tournament managers
+# such as cutechess-cli
+#
+# Supports uci, isready, ucinewgame, position startpos|fen <fen> [moves ...],
+# go [depth N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N]
+# [infinite] [ponder], stop, ponderhit and quit. Searches run in a thread,
+# so stop and isready are answered while searching; info lines are sent
+# after every iteration. In infinite and ponder mode bestmove waits for
+# stop (or ponderhit, which starts the clock) even if the search ends.
+#
+# A position command that extends the previous one (the usual case in a
+# game: same start, one or two more moves) only plays the new moves.
+#
+# Usage:
+#   python chess_uci.py
+#   python chess_uci.py --book book.bin --tablebase tables/
+#   cutechess-cli -engine cmd="python chess_uci.py" ...
+
+import argparse
+import sys
+import threading
+
+from chess_engine import Game, START_FEN
+from chess_search import MATE, MATE_BOUND, MAX_PLY, Searcher
+
+NAME = "chess_engine"
+
+# Clock allocation: an even share of the remaining time over this many
+# moves when the GUI does not send movestogo, plus most of the increment
+DEFAULT_MOVES_TO_GO = 30
+INCREMENT_SHARE = 0.8
+# Kept back from every allocation for process and pipe overhead
+MOVE_OVERHEAD = 0.05
+
+
+def score_text(score):
+    """UCI score field for a search score from the side to move's view."""
+    if score > MATE_BOUND:
+        return f"mate {(MATE - score + 1) // 2}"
+    if score < -MATE_BOUND:
+        return f"mate {-((MATE + score) // 2)}"
+    return f"cp {score}"
+
+
+def info_line(result):
+    ms = int(result.seconds * 1000)
+    pv = " ".join(m.uci() for m in result.pv)
+    return (f"info depth {result.depth} score {score_text(result.score)} "
+            f"nodes {result.nodes} nps {result.nps} time {ms} pv {pv}")
+
+
+def parse_go(tokens):
+    """Dict of the numeric go parameters, plus "infinite" if given."""
+    params = {}
+    i = 0
+    while i < len(tokens):
+        name = tokens[i]
+        if name in ("infinite", "ponder"):
+            params[name] = True
+            i += 1
+            continue
+        if i + 1 < len(tokens):
+            try:
+                params[name] = int(tokens[i + 1])
+            except ValueError:
+                pass
+        i += 2
+    return params
+
+
+def time_budget(params, turn):
+    """Seconds to spend on this move, or None when the clock is not used."""
+    if "movetime" in params:
+        return max(0.01, params["movetime"] / 1000 - MOVE_OVERHEAD)
+    left = params.get("wtime" if turn == "White" else "btime")
+    if left is None:
+        return None
+    inc = params.get("winc" if turn == "White" else "binc", 0)
+    moves_to_go = params.get("movestogo") or DEFAULT_MOVES_TO_GO
+    budget = left / moves_to_go + inc * INCREMENT_SHARE
+    # Never plan to use more than half of what is left
+    budget = min(budget, left / 2) / 1000 - MOVE_OVERHEAD
+    return max(0.01, budget)
+
+
+class UciEngine:
+    """Protocol state: the current game, the searcher and its thread."""
+
+    def __init__(self, searcher=None, out=sys.stdout):
+        self.searcher = searcher or Searcher()
+        self.searcher.on_iteration = lambda result: self.send(info_line(result))
+        self.out = out
+        self._out_lock = threading.Lock()
+        self.thread = None
+        # Per go: stop_event ends the search, release lets bestmove out in
+        # infinite/ponder mode; ponder_budget is the time to use after ponderhit
+        self.stop_event = threading.Event()
+        self.release = threading.Event()
+        self.ponder_budget = None
+        self.timer = None
+        self.start = None
+        self.played = []
+        self.game = Game()
+        self.game.start_game()
+
+    def send(self, line):
+        with self._out_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def set_position(self, start, moves):
+        """Sets the game to start (a FEN) followed by moves (UCI strings),
+        playing only the new moves when the current game is a prefix."""
+        if start != self.start or moves[:len(self.played)] != self.played:
+            game = Game()
+            game.load_fen(start)
+            self.game = game
+            self.start = start
+            self.played = []
+        for uci in moves[len(self.played):]:
+            move = self.game.move_from_uci(uci)
+            if move is None:
+                self.send(f"info string illegal move {uci}")
+                break
+            self.game.apply_move(move)
+            self.played.append(uci)
+
+    def go(self, params):
+        self.stop()
+        movetime = time_budget(params, self.game.state.turn)
+        depth = params.get("depth")
+        wait = bool(params.get("infinite") or params.get("ponder"))
+        self.ponder_budget = None
+        if params.get("ponder"):
+            # The clock only applies from ponderhit on
+            self.ponder_budget, movetime = movetime, None
+        if depth is None and movetime is None:
+            depth = MAX_PLY - 1 if wait else None
+        self.stop_event = threading.Event()
+        self.release = threading.Event()
+        if not wait:
+            self.release.set()
+        game = self.game.copy()
+        self.thread = threading.Thread(
+            target=self._search, args=(game, depth, movetime, self.stop_event, self.release),
+            daemon=True)
+        self.thread.start()
+
+    def ponderhit(self):
+        """The pondered move was played: search on for the move's budget."""
+        if self.thread is None or self.release.is_set():
+            return
+        if self.ponder_budget is not None:
+            self.timer = threading.Timer(self.ponder_budget, self.stop_event.set)
+            self.timer.daemon = True
+            self.timer.start()
+        else:
+            self.stop_event.set()
+        self.release.set()
+
+    def _search(self, game, depth, movetime, stop_event, release):
+        result = self.searcher.search(game, depth=depth, movetime=movetime,
+                                      stop_event=stop_event)
+        # UCI forbids bestmove in infinite and ponder mode before stop
+        release.wait()
+        if result.move is None:
+            # Checkmated or stalemated
+            self.send(f"info depth 0 score {score_text(result.score)}")
+            self.send("bestmove 0000")
+        else:
+            if not result.depth:
+                # Book and tablebase moves skip the iteration callback
+                self.send(info_line(result))
+            self.send(f"bestmove {result.move.uci()}")
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.thread is not None:
+            self.stop_event.set()
+            self.release.set()
+            self.thread.join()
+            self.thread = None
+
+    def command(self, line):
+        """Handles one command line; returns False on quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        cmd, args = tokens[0], tokens[1:]
+        if cmd == "uci":
+            self.send(f"id name {NAME}")
+            self.send("id author chess_engine authors")
+            self.send("uciok")
+        elif cmd == "isready":
+            self.send("readyok")
+        elif cmd == "ucinewgame":
+            self.stop()
+            self.searcher.tt.clear()
+            self.start = None
+        elif cmd == "position":
+            self.stop()
+            if "moves" in args:
+                i = args.index("moves")
+                spec, moves = args[:i], args[i + 1:]
+            else:
+                spec, moves = args, []
+            if spec[:1] == ["startpos"]:
+                start = START_FEN
+            elif spec[:1] == ["fen"]:
+                start = " ".join(spec[1:])
+            else:
+                self.send(f"info string bad position command: {line.strip()}")
+                return True
+            try:
+                self.set_position(start, moves)
+            except ValueError as e:
+                self.send(f"info string {e}")
+        elif cmd == "go":
+            self.go(parse_go(args))
+        elif cmd == "stop":
+            self.stop()
+        elif cmd == "ponderhit":
+            self.ponderhit()
+        elif cmd == "quit":
+            self.stop()
+            return False
+        # Other commands (setoption, debug) are accepted and ignored
+        return True
+
+    def run(self, lines):
+        for line in lines:
+            if not self.command(line):
+                break
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UCI chess engine")
+    parser.add_argument("--book", help="opening book file (chess_book.py)")
+    parser.add_argument("--tablebase", help="tablebase directory (chess_tablebase.py)")
+    parser.add_argument("--tt-bits", type=int, default=18,
+                        help="transposition table size as a power of two")
+    args = parser.parse_args(argv)
+    book = tablebase = None
+    if args.book:
+        from chess_book import OpeningBook
+        book = OpeningBook(args.book)
+    if args.tablebase:
+        from chess_tablebase import Tablebase
+        tablebase = Tablebase(args.tablebase)
+    searcher = Searcher(args.tt_bits, book=book, tablebase=tablebase)
+    UciEngine(searcher).run(sys.stdin)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())